@@ -3,9 +3,12 @@
  * POST /api/search-defs       — body: { "q": "..." }
  *
  * Loads precomputed embeddings from S3 and returns top matches.
- * Embeddings are generated offline via sentence-transformers.
+ * Embeddings are generated offline via sentence-transformers and stored in
+ * the binary format written by scripts/embstore.py (header + float32/float16
+ * matrix + id sidecar); the legacy JSON file is used if the binary is missing.
  */
 
+import { createHash } from 'node:crypto';
 import { S3Client, GetObjectCommand } from '@aws-sdk/client-s3';
 
 const s3 = new S3Client({ region: process.env.AWS_REGION || 'us-east-1' });
@@ -16,19 +19,71 @@ const TOP_N  = 8;
 let _meta = null;
 let _emb  = null;
 
-async function loadS3Json(key) {
+async function loadS3Buffer(key) {
   const cmd = new GetObjectCommand({ Bucket: BUCKET, Key: key });
   const res = await s3.send(cmd);
   const chunks = [];
   for await (const chunk of res.Body) chunks.push(chunk);
-  return JSON.parse(Buffer.concat(chunks).toString('utf8'));
+  return Buffer.concat(chunks);
+}
+
+async function loadS3Json(key) {
+  return JSON.parse((await loadS3Buffer(key)).toString('utf8'));
+}
+
+function halfToFloat(h) {
+  const exp = (h >> 10) & 0x1f, frac = h & 0x3ff, sign = h & 0x8000 ? -1 : 1;
+  if (exp === 0) return sign * frac * 2 ** -24;
+  if (exp === 0x1f) return frac ? NaN : sign * Infinity;
+  return sign * (1 + frac / 1024) * 2 ** (exp - 15);
+}
+
+/**
+ * Parse an embedding store (scripts/embstore.py) into { id: Float32Array }.
+ * Rows are views into one matrix; float16 stores are widened on load.
+ */
+function parseEmbStore(buf, rawIds) {
+  if (buf.toString('latin1', 0, 4) !== 'EMB1') throw new Error('not an embedding store');
+  const headerLen = buf.readUInt32LE(4);
+  const header    = JSON.parse(buf.toString('utf8', 8, 8 + headerLen));
+  const ids       = JSON.parse(rawIds.toString('utf8'));
+  const digest    = createHash('sha256').update(rawIds).digest('hex').slice(0, 16);
+  if (header.version !== 1 || digest !== header.ids_sha256 || ids.length !== header.count) {
+    throw new Error('embedding store and id sidecar do not match');
+  }
+  const { count, dim, dtype } = header;
+  const start = buf.byteOffset + 8 + headerLen;
+  let matrix;
+  if (dtype === 'float32') {
+    // slice() copies into a fresh, 4-byte-aligned ArrayBuffer
+    matrix = new Float32Array(buf.buffer.slice(start, start + count * dim * 4));
+  } else {
+    const halves = new Uint16Array(buf.buffer.slice(start, start + count * dim * 2));
+    matrix = Float32Array.from(halves, halfToFloat);
+  }
+  const emb = {};
+  ids.forEach((id, i) => { emb[id] = matrix.subarray(i * dim, (i + 1) * dim); });
+  return emb;
+}
+
+async function loadEmbeddings() {
+  try {
+    const [buf, rawIds] = await Promise.all([
+      loadS3Buffer('data/definitions-embeddings.bin'),
+      loadS3Buffer('data/definitions-embeddings.ids.json'),
+    ]);
+    return parseEmbStore(buf, rawIds);
+  } catch (err) {
+    console.warn('[search-defs] binary embeddings unavailable, falling back to JSON:', err.message);
+    return loadS3Json('data/definitions-embeddings.json');
+  }
 }
 
 async function getStore() {
   if (!_meta || !_emb) {
     [_meta, _emb] = await Promise.all([
       loadS3Json('data/definitions-meta.json'),
-      loadS3Json('data/definitions-embeddings.json'),
+      loadEmbeddings(),
     ]);
     console.log(`[search-defs] loaded ${_meta.length} definitions, ${Object.keys(_emb).length} embeddings`);
   }
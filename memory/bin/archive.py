@@ -1,20 +1,54 @@
 #!/usr/bin/env python3
 """
 Archive memory files older than HOT_DAYS to S3 cold storage.
-Maintains a searchable index.json in S3.
+Maintains a searchable index in S3, sharded by year (see coldstore.py):
+a run reads only the years it archives into and rewrites only those.
 Runs weekly via cron.
 
-Usage: python3 memory/bin/archive.py [--dry-run] [--days 90]
+Files are packed a month at a time into bundles (archive/YYYY/YYYY-MM.pack,
+see bundle.py), so a month is one object. A month is packed once every day
+in it is past the cutoff; a straggler for an already-packed month goes into
+an extra bundle (YYYY-MM-2.pack). --migrate repacks older per-file .gz
+archives into bundles, and --prune then deletes the old objects.
+
+--codec zstd compresses members with zstd, primed with the current trained
+dictionary when one has been published (python3 memory/bin/zdict.py train).
+
+After a run, archived files leave the hot tier (see tiers.py): each one is
+read back from the store and compared with the file on disk, and only exact
+matches are deleted from memory/ and hot.db, which is then compacted.
+--no-evict leaves them in place.
+
+The destination is any coldstore.py store: S3 by default, or a local
+directory via --store / MEMORY_COLD_STORE (handy for trying things out).
+
+Months are compressed and uploaded by a pool of --jobs worker threads (gzip
+and the S3 client both release the GIL), with at most --jobs uploads in
+flight. Failed uploads are retried with exponential backoff; the index only
+gains entries for months that actually landed.
+
+Usage: python3 memory/bin/archive.py [--dry-run] [--days 90] [--store URL] [--jobs 8] [--no-evict]
+       python3 memory/bin/archive.py --migrate [--prune]
+       python3 memory/bin/archive.py --codec zstd
 """
-import os, sys, json, gzip, re, argparse, subprocess
+import os, sys, gzip, re, argparse, random, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import date, timedelta
 
+import bundle
+import coldstore
+import tiers
+import zdict
+
 WORKSPACE  = Path(__file__).resolve().parents[2]
 MEMORY_DIR = WORKSPACE / 'memory'
-S3_BUCKET  = 'pax-memory-sbdz'
 S3_PREFIX  = 'archive/'
 HOT_DAYS   = 90   # files older than this get archived
+JOBS       = 8    # concurrent compress+upload workers
+RETRIES    = 3    # extra attempts per upload after the first
+BACKOFF    = 0.5  # seconds before the first retry; doubles each time, ±50% jitter
+CODEC      = 'gzip'
 
 def get_date_from_file(filepath: Path):
     m = re.search(r'(\d{4}-\d{2}-\d{2})', filepath.name)
@@ -35,89 +69,245 @@ def extract_title(text: str, fallback: str):
     m = re.search(r'^#{1,2}\s+(.+)$', text, re.MULTILINE)
     return m.group(1) if m else fallback
 
-def load_s3_index():
-    result = subprocess.run(
-        ['aws', 's3', 'cp', f's3://{S3_BUCKET}/index.json', '-'],
-        capture_output=True, text=True
-    )
-    if result.returncode == 0:
+def load_s3_index(store, since=None, until=None):
+    # Always revalidate, so "already archived" reflects the latest commit
+    try:
+        return coldstore.fetch_index(store, ttl=0, since=since, until=until)
+    except Exception as e:
+        print(f"[archive] Could not load index: {e}", file=sys.stderr)
+        return []
+
+def save_s3_index(store, add: list, drop=(), dry_run=False):
+    """Commit index changes (compare-and-swap, so concurrent runs can't lose entries) → success."""
+    if dry_run:
+        print(f"[dry-run] Would commit {len(add)} entries to {store.url}/{coldstore.MANIFEST_KEY}")
+        return True
+    try:
+        manifest = coldstore.commit_entries(store, add, drop)
+    except coldstore.StoreError as e:
+        print(f"[archive] Failed to update index: {e}", file=sys.stderr)
+        return False
+    print(f"[archive] Index version {manifest['version']}: "
+          + ', '.join(f"{y} ({info['count']})" for y, info in manifest['shards'].items()))
+    return True
+
+def put_with_retry(store, key: str, data: bytes, **kwargs):
+    for attempt in range(RETRIES + 1):
         try:
-            return json.loads(result.stdout)
-        except Exception:
-            pass
-    return []
+            return store.put(key, data, **kwargs)
+        except coldstore.StoreError as e:
+            if attempt == RETRIES:
+                raise
+            delay = BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"[archive] Retrying {key} in {delay:.1f}s: {e}", file=sys.stderr)
+            time.sleep(delay)
+
+def month_end(d: date):
+    nxt = date(d.year + d.month // 12, d.month % 12 + 1, 1)
+    return nxt - timedelta(days=1)
+
+def bundle_key(month: str, taken: set):
+    """archive/YYYY/YYYY-MM.pack, or -2, -3 … if that month already has a bundle."""
+    key, n = f"{S3_PREFIX}{month[:4]}/{month}{bundle.SUFFIX}", 1
+    while key in taken:
+        n  += 1
+        key = f"{S3_PREFIX}{month[:4]}/{month}-{n}{bundle.SUFFIX}"
+    taken.add(key)
+    return key
+
+def pack_month(store, key: str, days, codec=('gzip', None), dry_run=False):
+    """
+    Pack one month and upload it. `days` are (name, raw bytes, date, title,
+    summary); `codec` is (name, zstd dictionary id or None) → (index entries
+    or None on failure, raw bytes, stored bytes).
+    """
+    name, did = codec
+    zd = zdict.load(store, did) if did else None
+    data, rows = bundle.pack([(n, raw) for n, raw, *_ in days], name, zd)
+    entries = [{'date': d.isoformat(), 'title': title, 'summary': summary, 'key': key,
+                'member': row['name'], 'offset': row['offset'], 'length': row['length'],
+                'size': row['size'], 'sha256': row['sha256'], 'codec': name,
+                **({'zdict': did} if did else {})}
+               for row, (_, _, d, title, summary) in zip(rows, days)]
+    raw_size = sum(len(raw) for _, raw, *_ in days)
 
-def save_s3_index(index: list, dry_run=False):
-    data = json.dumps(index, indent=2).encode()
     if dry_run:
-        print(f"[dry-run] Would update s3://{S3_BUCKET}/index.json ({len(index)} entries)")
-        return
-    proc = subprocess.run(
-        ['aws', 's3', 'cp', '-',
-         f's3://{S3_BUCKET}/index.json',
-         '--content-type', 'application/json'],
-        input=data, capture_output=True
-    )
-    if proc.returncode != 0:
-        print(f"[archive] Failed to update index: {proc.stderr.decode()}", file=sys.stderr)
-
-def archive_file(filepath: Path, file_date: date, dry_run=False):
-    text    = filepath.read_text(encoding='utf-8', errors='replace')
-    title   = extract_title(text, filepath.stem)
-    summary = extract_summary(text)
-    s3_key  = f"{S3_PREFIX}{file_date.year}/{filepath.name}.gz"
+        print(f"[dry-run] Would pack {len(days)} file(s) → {store.url}/{key} ({len(data) / 1e3:.0f} kB)")
+        return entries, 0, 0
+    try:
+        put_with_retry(store, key, data, content_type='application/octet-stream')
+    except coldstore.StoreError as e:
+        print(f"[archive] Upload failed for {key}: {e}", file=sys.stderr)
+        return None, raw_size, 0
+
+    print(f"[archive] ✓ {len(days)} file(s) → {store.url}/{key}")
+    return entries, raw_size, len(data)
+
+def archive_month(store, key: str, files, codec, dry_run=False):
+    """Read, summarise and pack one month of memory files."""
+    days = []
+    for filepath, file_date in files:
+        # Archive the bytes as they are (tiers.verify compares them before evicting);
+        # decode only for the title and summary, with read_text()'s newline handling
+        raw  = filepath.read_bytes()
+        text = raw.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+        days.append((filepath.name, raw, file_date,
+                     extract_title(text, filepath.stem), extract_summary(text)))
+    return pack_month(store, key, days, codec, dry_run=dry_run)
+
+def migrate_month(store, key: str, legacy, codec, dry_run=False):
+    """Repack one month of per-file .gz archives (their index entries) into a bundle."""
+    days = []
+    for e in legacy:
+        data, _ = store.get(e['key'])
+        days.append((coldstore.archived_name(e), gzip.decompress(data), date.fromisoformat(e['date']),
+                     e.get('title', ''), e.get('summary', '')))
+    return pack_month(store, key, days, codec, dry_run=dry_run)
 
+def shrink_hot(store, old_files, index, jobs=JOBS, dry_run=False):
+    """
+    Lifecycle step after a run: evict archived files whose archive reads
+    back intact, expire stale promoted days, and compact hot.db.
+    """
+    by_name  = {coldstore.archived_name(e): e for e in index}
+    archived = [by_name[fp.name] for fp, _ in old_files if fp.name in by_name]
     if dry_run:
-        print(f"[dry-run] Would archive {filepath.name} → s3://{S3_BUCKET}/{s3_key}")
-        return {'date': file_date.isoformat(), 'title': title, 'summary': summary, 'key': s3_key}
-
-    compressed = gzip.compress(text.encode('utf-8'))
-    proc = subprocess.run(
-        ['aws', 's3', 'cp', '-',
-         f's3://{S3_BUCKET}/{s3_key}',
-         '--content-type', 'application/gzip',
-         '--content-encoding', 'gzip'],
-        input=compressed, capture_output=True
-    )
-    if proc.returncode != 0:
-        print(f"[archive] Upload failed for {filepath.name}: {proc.stderr.decode()}", file=sys.stderr)
-        return None
-
-    print(f"[archive] ✓ {filepath.name} → s3://{S3_BUCKET}/{s3_key}")
-    return {'date': file_date.isoformat(), 'title': title, 'summary': summary, 'key': s3_key}
+        print(f"[dry-run] Would verify and evict {len(archived)} archived file(s) from the hot tier")
+        return
+    paths   = tiers.verify(store, archived, jobs)
+    conn    = tiers.open_hot()
+    evicted = tiers.evict(conn, paths)
+    if conn is None:
+        expired, sizes = 0, None
+    else:
+        expired = tiers.expire(conn)
+        sizes   = tiers.compact(conn) if evicted or expired else None
+        conn.close()
+    if evicted or expired:
+        print(f"[archive] Evicted {evicted} verified file(s) and {expired} expired promoted day(s) "
+              f"from the hot tier" + (f"; hot.db {sizes[0]:.0f} → {sizes[1]:.0f} KiB" if sizes else ''))
+    if len(paths) < len(archived):
+        print(f"[archive] {len(archived) - len(paths)} archived file(s) failed verification and stay hot",
+              file=sys.stderr)
+
+def run_jobs(jobs, tasks):
+    """
+    Run (fn, args) tasks on a pool → (entries from successful tasks, raw
+    bytes, stored bytes, failed task count, seconds).
+    """
+    started = time.monotonic()
+    entries, raw_total, stored_total, failed = [], 0, 0, 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(fn, *args) for fn, *args in tasks]
+        for future in as_completed(futures):
+            try:
+                got, raw, stored = future.result()
+            except (KeyError, OSError, coldstore.StoreError) as e:
+                print(f"[archive] {e}", file=sys.stderr)
+                got = None
+            if got:
+                entries.extend(got)
+                raw_total    += raw
+                stored_total += stored
+            else:
+                failed += 1
+    return entries, raw_total, stored_total, failed, time.monotonic() - started
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--dry-run', action='store_true')
     parser.add_argument('--days', type=int, default=HOT_DAYS)
+    parser.add_argument('--store', metavar='URL',
+                        help=f'Cold store: s3://bucket or a directory (default {coldstore.DEFAULT_URL})')
+    parser.add_argument('--jobs', type=int, default=JOBS, help=f'Concurrent uploads (default {JOBS})')
+    parser.add_argument('--migrate', action='store_true',
+                        help='Repack existing per-file .gz archives into monthly bundles')
+    parser.add_argument('--prune', action='store_true',
+                        help='With --migrate: delete the per-file objects once the index points at bundles')
+    parser.add_argument('--codec', choices=['gzip', 'zstd'], default=CODEC,
+                        help=f'Member compression (default {CODEC}); zstd uses the current trained dictionary')
+    parser.add_argument('--evict', action=argparse.BooleanOptionalAction, default=True,
+                        help='Remove archived files from memory/ and hot.db once their archive '
+                             'verifies (default on)')
     args = parser.parse_args()
 
+    store    = coldstore.open_store(args.store)
+    codec    = (args.codec, None)
+    if args.codec == 'zstd':
+        if not zdict.available():
+            sys.exit("[archive] --codec zstd needs the zstandard package: pip install zstandard")
+        current = zdict.current(store)
+        if current:
+            codec = ('zstd', current[0])
+        else:
+            print("[archive] No trained dictionary published; using plain zstd "
+                  "(train one with: python3 memory/bin/zdict.py train)")
     cutoff   = date.today() - timedelta(days=args.days)
-    index    = load_s3_index()
-    archived = {e['key'] for e in index}
-    new_entries = []
 
-    candidates = sorted(MEMORY_DIR.glob('*.md'))
-    for filepath in candidates:
-        file_date = get_date_from_file(filepath)
-        if file_date >= cutoff:
-            continue  # still hot
-
-        s3_key = f"{S3_PREFIX}{file_date.year}/{filepath.name}.gz"
-        if s3_key in archived:
-            print(f"[archive] Already archived: {filepath.name}")
-            continue
+    if args.migrate:
+        index  = load_s3_index(store)
+        taken  = {e['key'] for e in index}
+        legacy = {}
+        for e in index:
+            if not e.get('member') and e['key'].endswith('.gz'):
+                legacy.setdefault(e['date'][:7], []).append(e)
+        tasks = [(migrate_month, store, bundle_key(month, taken), sorted(es, key=lambda e: e['date']),
+                  codec, args.dry_run) for month, es in sorted(legacy.items())]
+        if not tasks:
+            print("[archive] No per-file archives to migrate.")
+            return
+    else:
+        old_files = [(fp, d) for fp in sorted(MEMORY_DIR.glob('*.md'))
+                     if (d := get_date_from_file(fp)) < cutoff]
+        if not old_files:
+            print("[archive] Nothing to archive.")
+            if args.evict:
+                shrink_hot(store, [], [], args.jobs, args.dry_run)
+            return
+        # Only the years these files fall in can already hold them (or their bundle keys)
+        years    = sorted({d.year for _, d in old_files})
+        index    = load_s3_index(store, since=f"{years[0]}-01-01", until=f"{years[-1]}-12-31")
+        taken    = {e['key'] for e in index}
+        archived = {coldstore.archived_name(e) for e in index}
+        months   = {}
+        for filepath, file_date in old_files:
+            if filepath.name in archived:
+                if not args.evict:
+                    print(f"[archive] Already archived: {filepath.name}")
+                continue
+            months.setdefault(file_date.strftime('%Y-%m'), []).append((filepath, file_date))
+        # Bundles are immutable, so a month waits until none of its days can still be hot
+        tasks = [(archive_month, store, bundle_key(month, taken), files, codec, args.dry_run)
+                 for month, files in sorted(months.items())
+                 if month_end(files[0][1]) < cutoff]
 
-        entry = archive_file(filepath, file_date, dry_run=args.dry_run)
-        if entry:
-            new_entries.append(entry)
+    new_entries, raw_total, stored_total, failed, elapsed = run_jobs(args.jobs, tasks)
 
     if new_entries:
-        index.extend(new_entries)
-        save_s3_index(index, dry_run=args.dry_run)
-        print(f"\n[archive] {len(new_entries)} file(s) archived, index updated.")
+        new_entries.sort(key=lambda e: (e['date'], e['key']))
+        old = []
+        if args.migrate:
+            moved = {coldstore.archived_name(e) for e in new_entries}
+            old   = [e for e in index if not e.get('member') and coldstore.archived_name(e) in moved]
+        if not save_s3_index(store, new_entries, old, dry_run=args.dry_run):
+            sys.exit(1)   # the uploads stand, unindexed; the next run repacks those days
+        print(f"\n[archive] {len(new_entries)} file(s) {'migrated' if args.migrate else 'archived'}, index updated.")
+        if not args.dry_run:
+            print(f"[archive] {raw_total / 1e6:.1f} MB → {stored_total / 1e6:.1f} MB in {elapsed:.1f}s "
+                  f"({len(new_entries) / max(elapsed, 1e-9):.1f} files/s, "
+                  f"{raw_total / 1e6 / max(elapsed, 1e-9):.1f} MB/s, {args.jobs} workers)")
+        if args.migrate and args.prune and not args.dry_run:
+            for e in old:
+                store.delete(e['key'])
+            print(f"[archive] Pruned {len(old)} per-file archive(s).")
     else:
         print("[archive] Nothing to archive.")
+    if args.evict and not args.migrate:
+        shrink_hot(store, old_files, index + new_entries, args.jobs, args.dry_run)
+    if failed:
+        print(f"[archive] {failed} month(s) failed; they stay where they are and will be retried next run.",
+              file=sys.stderr)
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Packed monthly archive bundles for the cold tier.
+
+A bundle (archive/YYYY/YYYY-MM.pack) holds a month of memory files as one
+object, so a month can be fetched with a single GET and listed or restored
+without touching hundreds of keys:
+
+  ┌──────────┬──────────┬─────┬────────────┬──────────────────────────┐
+  │ member 0 │ member 1 │ ... │ table JSON │ footer (16 bytes)        │
+  └──────────┴──────────┴─────┴────────────┴──────────────────────────┘
+  footer = table offset (u64 LE) · table length (u32 LE) · b'MPK1'
+
+Each member is compressed on its own, so any one file can be read with a
+byte-range GET of [offset, offset + length). The table is JSON:
+
+  {"version": 1, "codec": "gzip" | "zstd", "zdict": <id>,
+   "members": [{"name", "offset", "length", "size", "sha256"}, ...]}
+
+"zstd" bundles may be primed with a trained dictionary (zdict.py), named
+by its id; the id is absent for gzip and for zstd without a dictionary.
+
+index.json entries for bundled files copy name/offset/length/codec, so a
+single-file read needs no table lookup at all. Stores are duck-typed: get()
+for whole objects and get_range() for byte ranges (see coldstore.py).
+
+archive.py writes bundles and migrates older per-file archives into them;
+coldstore.py reads members for search.py --deep.
+"""
+import gzip, hashlib, json, struct
+
+import zdict
+
+MAGIC   = b'MPK1'
+VERSION = 1
+FOOTER  = struct.Struct('<QI4s')   # table offset, table length, magic
+SUFFIX  = '.pack'
+
+class BundleError(Exception):
+    """Not a bundle, or a damaged one."""
+
+def compress(raw: bytes, codec: str = 'gzip', zd=None):
+    """Compress one member; `zd` is zstd dictionary bytes (zstd only)."""
+    if codec == 'gzip':
+        return gzip.compress(raw, mtime=0)
+    if codec == 'zstd':
+        return zdict.compress(raw, zd)
+    raise BundleError(f"unknown codec {codec!r}")
+
+def decompress(blob: bytes, codec: str = 'gzip', zd=None):
+    if codec == 'gzip':
+        return gzip.decompress(blob)
+    if codec == 'zstd':
+        return zdict.decompress(blob, zd)
+    raise BundleError(f"unknown codec {codec!r}")
+
+def _dict_for(store, did):
+    return zdict.load(store, did) if did else None
+
+def pack(members, codec='gzip', zd=None):
+    """
+    Build a bundle from (name, raw bytes) pairs → (bundle bytes, table rows).
+    Members keep the order given; `zd` is an optional zstd dictionary.
+    """
+    out, rows = bytearray(), []
+    for name, raw in members:
+        blob = compress(raw, codec, zd)
+        rows.append({'name': name, 'offset': len(out), 'length': len(blob),
+                     'size': len(raw), 'sha256': hashlib.sha256(raw).hexdigest()})
+        out += blob
+    head  = {'version': VERSION, 'codec': codec}
+    if zd:
+        head['zdict'] = zdict.dict_id(zd)
+    table = json.dumps({**head, 'members': rows}, separators=(',', ':')).encode()
+    offset = len(out)
+    out += table + FOOTER.pack(offset, len(table), MAGIC)
+    return bytes(out), rows
+
+def _footer(tail: bytes):
+    if len(tail) < FOOTER.size:
+        raise BundleError("truncated bundle")
+    offset, length, magic = FOOTER.unpack(tail[-FOOTER.size:])
+    if magic != MAGIC:
+        raise BundleError("bad bundle magic")
+    return offset, length
+
+def _table(raw: bytes):
+    table = json.loads(raw)
+    if table.get('version') != VERSION:
+        raise BundleError(f"unsupported bundle version {table.get('version')}")
+    return table
+
+def unpack(data: bytes, store=None, verify=False):
+    """
+    Every member of a whole bundle → [(row, raw bytes)], with the codec in
+    each row. `store` is only needed to fetch a zstd dictionary.
+    """
+    offset, length = _footer(data)
+    table = _table(data[offset:offset + length])
+    zd    = _dict_for(store, table.get('zdict'))
+    out = []
+    for row in table['members']:
+        raw = decompress(data[row['offset']:row['offset'] + row['length']], table['codec'], zd)
+        if verify and hashlib.sha256(raw).hexdigest() != row['sha256']:
+            raise BundleError(f"checksum mismatch for {row['name']}")
+        out.append((dict(row, codec=table['codec']), raw))
+    return out
+
+def read_table(store, key: str):
+    """A bundle's table via two range reads: the footer (a suffix range), then the table."""
+    offset, length = _footer(store.get_range(key, -FOOTER.size))
+    return _table(store.get_range(key, offset, length))
+
+def read_bundle(store, key: str, verify=False):
+    """The whole month in one GET → [(row, raw bytes)]."""
+    data, _ = store.get(key)
+    return unpack(data, store, verify=verify)
+
+def read_member(store, entry: dict):
+    """One file from a bundle with a single range read, using the offsets in its index entry."""
+    blob = store.get_range(entry['key'], entry['offset'], entry['length'])
+    return decompress(blob, entry.get('codec', 'gzip'), _dict_for(store, entry.get('zdict')))
@@ -0,0 +1,636 @@
+#!/usr/bin/env python3
+"""
+Cold-tier storage shared by archive.py and search.py.
+
+A store is addressed by URL: `s3://bucket` (the default, pax-memory-sbdz)
+or a local directory, which behaves like a bucket and is what tests and
+offline runs use. Override with the MEMORY_COLD_STORE environment variable.
+
+S3 goes through one in-process boto3 client per bucket, whose connection
+pool is shared by every call and thread, so archiving or deep-searching
+hundreds of files costs no process start-ups. Without boto3 the aws CLI
+is used instead, one process per request.
+
+Requirements (optional, for in-process S3):
+  pip install boto3
+
+Every store has the same calls:
+  get(key, etag=None) → (bytes, etag), or (None, etag) if `etag` still matches
+  get_range(key, start, length=None) → bytes; a negative start is a suffix
+  put(key, data, content_type, content_encoding=None,
+      if_match=None, if_none_match=None) → etag, or PreconditionFailed
+  delete(key)
+
+The cold index is sharded by year: index/<year>.<hash>.json holds a year's
+entries and index/manifest.json names the current shard for each year.
+Shards are content-addressed and never change, so once cached locally they
+are never fetched again. Only the manifest is revalidated, with
+If-None-Match and at most once per INDEX_TTL seconds, so a cold lookup costs
+one small conditional request when the TTL has lapsed and none otherwise.
+Readers fetch only the shards their date range needs. If the store can't be
+reached, cached copies are used as they are.
+
+commit_entries() rewrites only the touched years, then swaps the manifest
+with a conditional PUT (If-Match on the ETag it read, or If-None-Match: *
+when creating it). A concurrent writer therefore makes the PUT fail rather
+than silently losing an update, and the loser re-reads and re-applies its
+change. The first commit splits a pre-shard index.json into shards;
+until then readers use that file.
+
+index_db() keeps a small SQLite FTS5 database (cold-cache/index.db) in step
+with the manifest, loading and dropping whole shards as they come and go, so
+cold search is a ranked BM25 query rather than a scan of every archived day.
+
+read_archives() fetches archived days in parallel for search.py --deep and
+keeps them decompressed in cold-cache/archives/, trimmed least-recently-used
+first to ARCHIVE_CACHE_MB. Days packed in a monthly bundle (bundle.py) are
+read with one range GET each, or the whole bundle in one GET when several
+of its days are wanted. Archive keys are never rewritten, so a cached copy
+is always current and repeat reads never touch the store.
+"""
+import os, sys, json, gzip, fcntl, hashlib, random, sqlite3, subprocess, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import bundle
+
+WORKSPACE   = Path(__file__).resolve().parents[2]
+MEMORY_DIR  = WORKSPACE / 'memory'
+CACHE_DIR   = MEMORY_DIR / 'cold-cache'
+S3_BUCKET   = 'pax-memory-sbdz'
+DEFAULT_URL = f's3://{S3_BUCKET}'
+INDEX_KEY   = 'index.json'            # pre-shard index, read until the first sharded commit
+MANIFEST_KEY = 'index/manifest.json'
+INDEX_TTL   = 300   # seconds a cached manifest is trusted without asking the store
+CAS_RETRIES = 5     # attempts at swapping the manifest before giving up
+ARCHIVE_CACHE    = CACHE_DIR / 'archives'
+ARCHIVE_CACHE_MB = 256   # decompressed archives kept for --deep
+FETCH_WORKERS    = 8
+S3_POOL_SIZE     = 16    # HTTP connections kept open per S3 client (≥ concurrent workers)
+
+class StoreError(Exception):
+    """The store could not be reached or refused the request."""
+
+class PreconditionFailed(StoreError):
+    """A conditional put lost a race: the object changed (or appeared) since it was read."""
+
+class LocalStore:
+    """A directory laid out like a bucket; ETags are content MD5s, as on S3."""
+
+    def __init__(self, root):
+        self.root = Path(root).expanduser().resolve()
+        self.url  = str(self.root)
+
+    def get(self, key: str, etag=None):
+        try:
+            data = (self.root / key).read_bytes()
+        except FileNotFoundError:
+            raise KeyError(key) from None
+        tag = hashlib.md5(data).hexdigest()
+        return (None, tag) if tag == etag else (data, tag)
+
+    def get_range(self, key: str, start: int, length=None):
+        try:
+            with open(self.root / key, 'rb') as f:
+                f.seek(start, os.SEEK_END if start < 0 else os.SEEK_SET)
+                return f.read() if length is None else f.read(length)
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def put(self, key: str, data: bytes, content_type='application/octet-stream', content_encoding=None,
+            if_match=None, if_none_match=None):
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        if if_match is None and if_none_match is None:
+            os.replace(tmp, path)
+            return hashlib.md5(data).hexdigest()
+        # Conditional puts check and replace under one lock, like S3 does server-side
+        with open(self.root / '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                current = hashlib.md5(path.read_bytes()).hexdigest()
+            except FileNotFoundError:
+                current = None
+            if (if_none_match == '*' and current is not None) or \
+               (if_match is not None and current != if_match):
+                tmp.unlink()
+                raise PreconditionFailed(key)
+            os.replace(tmp, path)
+        return hashlib.md5(data).hexdigest()
+
+    def delete(self, key: str):
+        (self.root / key).unlink(missing_ok=True)
+
+class S3Store:
+    """S3 through a single boto3 client; clients are thread-safe and pool their connections."""
+
+    def __init__(self, bucket: str):
+        import boto3
+        from botocore.config import Config
+        self.bucket = bucket
+        self.url    = f's3://{bucket}'
+        self.client = boto3.client('s3', config=Config(
+            max_pool_connections=S3_POOL_SIZE,
+            retries={'max_attempts': 3, 'mode': 'standard'},
+        ))
+
+    def _call(self, method, key, **kwargs):
+        from botocore.exceptions import BotoCoreError, ClientError
+        try:
+            return getattr(self.client, method)(Bucket=self.bucket, Key=key, **kwargs)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code', '')
+            if code in ('304', 'NotModified'):
+                return None
+            if code in ('404', 'NoSuchKey'):
+                raise KeyError(key) from None
+            if code in ('412', 'PreconditionFailed', 'ConditionalRequestConflict'):
+                raise PreconditionFailed(key) from None
+            raise StoreError(str(e)) from None
+        except BotoCoreError as e:
+            raise StoreError(str(e)) from None
+
+    def get(self, key: str, etag=None):
+        resp = self._call('get_object', key, **({'IfNoneMatch': f'"{etag}"'} if etag else {}))
+        if resp is None:
+            return None, etag
+        return resp['Body'].read(), resp['ETag'].strip('"')
+
+    def get_range(self, key: str, start: int, length=None):
+        return self._call('get_object', key, Range=http_range(start, length))['Body'].read()
+
+    def put(self, key: str, data: bytes, content_type='application/octet-stream', content_encoding=None,
+            if_match=None, if_none_match=None):
+        extra = {'ContentEncoding': content_encoding} if content_encoding else {}
+        if if_match:
+            extra['IfMatch'] = f'"{if_match}"'
+        if if_none_match:
+            extra['IfNoneMatch'] = if_none_match
+        resp  = self._call('put_object', key, Body=data, ContentType=content_type, **extra)
+        return resp['ETag'].strip('"')
+
+    def delete(self, key: str):
+        self._call('delete_object', key)
+
+class S3CliStore:
+    """S3 through the aws CLI's s3api commands, which expose ETags and If-None-Match."""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+        self.url    = f's3://{bucket}'
+
+    def _s3api(self, *args):
+        try:
+            proc = subprocess.run(['aws', 's3api', *args], capture_output=True, text=True)
+        except OSError as e:
+            raise StoreError(str(e)) from None
+        return proc
+
+    def get(self, key: str, etag=None, byte_range=None):
+        fd, out = tempfile.mkstemp(prefix='coldstore-')
+        os.close(fd)
+        try:
+            args = ['get-object', '--bucket', self.bucket, '--key', key]
+            if etag:
+                args += ['--if-none-match', f'"{etag}"']
+            if byte_range:
+                args += ['--range', byte_range]
+            proc = self._s3api(*args, out)
+            if proc.returncode != 0:
+                if '304' in proc.stderr or 'Not Modified' in proc.stderr:
+                    return None, etag
+                if 'NoSuchKey' in proc.stderr or '404' in proc.stderr:
+                    raise KeyError(key)
+                raise StoreError(proc.stderr.strip())
+            tag = json.loads(proc.stdout).get('ETag', '').strip('"')
+            return Path(out).read_bytes(), tag
+        finally:
+            os.unlink(out)
+
+    def put(self, key: str, data: bytes, content_type='application/octet-stream', content_encoding=None,
+            if_match=None, if_none_match=None):
+        with tempfile.NamedTemporaryFile(prefix='coldstore-') as f:
+            f.write(data)
+            f.flush()
+            args = ['put-object', '--bucket', self.bucket, '--key', key,
+                    '--body', f.name, '--content-type', content_type]
+            if content_encoding:
+                args += ['--content-encoding', content_encoding]
+            if if_match:
+                args += ['--if-match', f'"{if_match}"']
+            if if_none_match:
+                args += ['--if-none-match', if_none_match]
+            proc = self._s3api(*args)
+        if proc.returncode != 0:
+            if 'PreconditionFailed' in proc.stderr or 'ConditionalRequestConflict' in proc.stderr:
+                raise PreconditionFailed(key)
+            raise StoreError(proc.stderr.strip())
+        return json.loads(proc.stdout).get('ETag', '').strip('"')
+
+    def get_range(self, key: str, start: int, length=None):
+        return self.get(key, byte_range=http_range(start, length))[0]
+
+    def delete(self, key: str):
+        proc = self._s3api('delete-object', '--bucket', self.bucket, '--key', key)
+        if proc.returncode != 0:
+            raise StoreError(proc.stderr.strip())
+
+def http_range(start: int, length=None):
+    """HTTP Range header value; a negative start asks for the last -start bytes."""
+    if start < 0:
+        return f'bytes={start}'
+    return f'bytes={start}-' + ('' if length is None else str(start + length - 1))
+
+_stores = {}   # url -> store, so each process keeps one client (and connection pool) per bucket
+
+def open_store(url=None):
+    """Store for `url`, MEMORY_COLD_STORE, or the default bucket, in that order."""
+    url = url or os.environ.get('MEMORY_COLD_STORE') or DEFAULT_URL
+    if url not in _stores:
+        if url.startswith('s3://'):
+            bucket = url[len('s3://'):].strip('/')
+            try:
+                _stores[url] = S3Store(bucket)
+            except ImportError:
+                _stores[url] = S3CliStore(bucket)
+        else:
+            _stores[url] = LocalStore(url[len('file://'):] if url.startswith('file://') else url)
+    return _stores[url]
+
+# ── Cached index ───────────────────────────────────────────────────────────
+
+_parsed = {}   # (url, key, etag) -> parsed JSON, for long-lived processes
+
+def _cache_paths(key: str):
+    return CACHE_DIR / key, CACHE_DIR / f'{key}.meta'
+
+def _read_meta(store, key: str):
+    data_path, meta_path = _cache_paths(key)
+    try:
+        meta = json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        return {}
+    # A cache filled from a different store says nothing about this one
+    return meta if meta.get('url') == store.url and data_path.exists() else {}
+
+def _atomic_write(path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def _write_cache(store, key: str, data, etag):
+    data_path, meta_path = _cache_paths(key)
+    if data is not None:
+        _atomic_write(data_path, data)
+    meta = {'url': store.url, 'etag': etag, 'checked': time.time()}
+    _atomic_write(meta_path, json.dumps(meta).encode())
+    return meta
+
+def _load_json(store, key: str, etag):
+    memo = (store.url, key, etag)
+    if memo not in _parsed:
+        _parsed[memo] = json.loads(_cache_paths(key)[0].read_bytes())
+    return _parsed[memo]
+
+def refresh(store, key: str, ttl=INDEX_TTL):
+    """
+    Bring the cached copy of a mutable object up to date → its ETag, or
+    None when the store doesn't have it. ttl=0 always revalidates.
+    """
+    meta = _read_meta(store, key)
+    if meta and time.time() - meta.get('checked', 0) < ttl:
+        return meta['etag']
+    try:
+        data, etag = store.get(key, etag=meta.get('etag'))
+    except KeyError:
+        return None
+    except StoreError as e:
+        if not meta:
+            raise
+        print(f"[coldstore] {store.url} unreachable, using cached {key}: {e}", file=sys.stderr)
+        return meta['etag']
+    return _write_cache(store, key, data, etag)['etag']
+
+def load_manifest(store, ttl=INDEX_TTL):
+    """(manifest, etag), or (None, None) while the index is still a single index.json."""
+    etag = refresh(store, MANIFEST_KEY, ttl)
+    return (_load_json(store, MANIFEST_KEY, etag), etag) if etag else (None, None)
+
+def read_shard(store, key: str):
+    """A shard's entries. Shard keys are content hashes, so a cached copy is always good."""
+    path = CACHE_DIR / key
+    if not path.exists():
+        data, _ = store.get(key)
+        _atomic_write(path, data)
+    memo = (store.url, key, None)
+    if memo not in _parsed:
+        _parsed[memo] = json.loads(path.read_bytes())
+    return _parsed[memo]
+
+def shard_years(manifest, since=None, until=None):
+    """Years whose shard can hold entries dated within [since, until]."""
+    return sorted(y for y, info in manifest['shards'].items()
+                  if not (since and info['last'] < since) and not (until and info['first'] > until))
+
+def _legacy_entries(store, ttl):
+    etag = refresh(store, INDEX_KEY, ttl)
+    return (_load_json(store, INDEX_KEY, etag), etag) if etag else ([], None)
+
+def fetch_index(store=None, ttl=INDEX_TTL, since=None, until=None):
+    """
+    Cold index entries from the shards overlapping [since, until] (whole
+    years, so callers still filter by date). An empty store gives [].
+    """
+    store = store or open_store()
+    for attempt in (0, 1):
+        manifest, _ = load_manifest(store, ttl)
+        if manifest is None:
+            return _legacy_entries(store, ttl)[0]
+        try:
+            return [e for y in shard_years(manifest, since, until)
+                    for e in read_shard(store, manifest['shards'][y]['key'])]
+        except KeyError:
+            ttl = 0   # a newer commit replaced (and deleted) a shard: re-read the manifest
+    raise StoreError("cold index shards keep disappearing")
+
+def archived_name(entry: dict):
+    """The memory file an index entry covers, for bundles and per-file archives alike."""
+    return entry.get('member') or Path(entry['key']).name.removesuffix('.gz')
+
+def _identity(entry):
+    return entry['key'], entry.get('member')
+
+def commit_entries(store, add=(), drop=()):
+    """
+    Add index entries and remove `drop`ped ones (matched by key and member),
+    rewriting only the years they touch, then compare-and-swap the manifest.
+    Retries from a fresh read when another writer got there first → the new
+    manifest.
+    """
+    add   = list({_identity(e): e for e in add}.values())
+    drop  = list(drop)
+    years = {e['date'][:4] for e in add + drop}
+    # Added entries replace any existing entry with the same key and member, so
+    # a retry after a concurrent writer added the same day never duplicates it.
+    drop  = {_identity(e) for e in drop} | {_identity(e) for e in add}
+    for attempt in range(CAS_RETRIES):
+        manifest, etag = load_manifest(store, ttl=0)
+        if manifest is None:
+            # First sharded commit: split the monolithic index.json into years
+            legacy, _ = _legacy_entries(store, ttl=0)
+            manifest, base = {'version': 0, 'shards': {}}, {}
+            for e in legacy:
+                base.setdefault(e['date'][:4], []).append(e)
+            touched = years | set(base)
+            current = lambda y: base.get(y, [])
+        else:
+            touched = years
+            current = lambda y: (read_shard(store, manifest['shards'][y]['key'])
+                                 if y in manifest['shards'] else [])
+
+        shards, written = dict(manifest['shards']), []
+        for year in sorted(touched):
+            entries = [e for e in current(year) if _identity(e) not in drop]
+            entries += [e for e in add if e['date'][:4] == year]
+            if not entries:
+                shards.pop(year, None)
+                continue
+            entries.sort(key=lambda e: (e['date'], e['key'], e.get('member') or ''))
+            data = json.dumps(entries, separators=(',', ':'), ensure_ascii=False).encode()
+            key  = f"index/{year}.{hashlib.sha256(data).hexdigest()[:12]}.json"
+            if key != shards.get(year, {}).get('key'):
+                store.put(key, data, content_type='application/json')
+                _atomic_write(CACHE_DIR / key, data)
+                written.append(key)
+            shards[year] = {'key': key, 'count': len(entries),
+                            'first': entries[0]['date'], 'last': entries[-1]['date']}
+
+        new  = {'version': manifest['version'] + 1,
+                'updated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'shards': dict(sorted(shards.items()))}
+        data = json.dumps(new, indent=1).encode()
+        try:
+            if etag:
+                new_etag = store.put(MANIFEST_KEY, data, content_type='application/json', if_match=etag)
+            else:
+                new_etag = store.put(MANIFEST_KEY, data, content_type='application/json', if_none_match='*')
+        except PreconditionFailed:
+            # Shard keys are content addresses: the winner may have written
+            # (and now reference) the very same shard, so keep those.
+            winner, _ = load_manifest(store, ttl=0)
+            live = {info['key'] for info in (winner or {}).get('shards', {}).values()}
+            for key in written:
+                if key not in live:
+                    store.delete(key)
+            delay = 0.2 * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"[coldstore] Index changed underneath us; retrying in {delay:.1f}s", file=sys.stderr)
+            time.sleep(delay)
+            continue
+        _write_cache(store, MANIFEST_KEY, data, new_etag)
+        # Superseded shards are unreachable from the new manifest; readers that
+        # still hold the old one re-read it when a shard has gone.
+        for year, info in manifest['shards'].items():
+            if shards.get(year, {}).get('key') != info['key']:
+                store.delete(info['key'])
+        return new
+    raise StoreError(f"cold index manifest kept changing; gave up after {CAS_RETRIES} attempts")
+
+# ── Search index ───────────────────────────────────────────────────────────
+
+INDEX_DB         = CACHE_DIR / 'index.db'
+INDEX_DB_VERSION = 4   # bump when INDEX_SCHEMA changes, to force a rebuild
+
+INDEX_SCHEMA = """
+CREATE TABLE entries (
+    id      INTEGER PRIMARY KEY,
+    shard   TEXT,     -- index object the entry was loaded from
+    date    TEXT,
+    key     TEXT,
+    title   TEXT,
+    summary TEXT,
+    member  TEXT,     -- bundled days: file name, byte range and codec inside `key`
+    offset  INTEGER,
+    length  INTEGER,
+    codec   TEXT,
+    zdict   TEXT      -- zstd dictionary id, if the bundle was packed with one
+);
+CREATE INDEX entries_date  ON entries(date);
+CREATE INDEX entries_shard ON entries(shard);
+CREATE VIRTUAL TABLE entries_fts USING fts5(
+    title, summary, content='entries', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+END;
+CREATE TRIGGER entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary);
+END;
+CREATE TABLE shards (key TEXT PRIMARY KEY);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_db      = {'url': None, 'conn': None}
+_db_lock = threading.Lock()   # search.py queries cold storage from a background thread
+
+def _connect_index_db(store):
+    """The process's connection to index.db, recreated if it was built by other code or for another store."""
+    if _db['conn'] is not None and _db['url'] == store.url:
+        return _db['conn']
+    if _db['conn'] is not None:
+        _db['conn'].close()
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(INDEX_DB, timeout=10, check_same_thread=False)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+    except sqlite3.Error:
+        meta = {}
+    if meta != {'schema': str(INDEX_DB_VERSION), 'url': store.url}:
+        conn.close()
+        INDEX_DB.unlink(missing_ok=True)
+        conn = sqlite3.connect(INDEX_DB, timeout=10, check_same_thread=False)
+        conn.executescript(INDEX_SCHEMA)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                         [('schema', str(INDEX_DB_VERSION)), ('url', store.url)])
+        conn.commit()
+    conn.execute("PRAGMA journal_mode=WAL")
+    _db.update(url=store.url, conn=conn)
+    return conn
+
+def index_db(store=None, ttl=INDEX_TTL, since=None, until=None):
+    """
+    Connection to the FTS5 index of cold entries, holding at least every
+    shard that overlaps [since, until], or None when there is no cold index
+    yet. Shards that left the manifest are dropped; the connection is reused.
+    """
+    store = store or open_store()
+    with _db_lock:
+        for attempt in (0, 1):
+            try:
+                return _sync_index_db(store, ttl, since, until)
+            except KeyError:
+                ttl = 0   # as in fetch_index: a shard named by the cached manifest is gone, re-read it
+    raise StoreError("cold index shards keep disappearing")
+
+def _sync_index_db(store, ttl, since, until):
+    manifest, _ = load_manifest(store, ttl)
+    if manifest is None:
+        entries, etag = _legacy_entries(store, ttl)
+        if etag is None:
+            return None
+        live   = {f'{INDEX_KEY}#{etag}'}
+        wanted = {f'{INDEX_KEY}#{etag}': lambda: entries}
+    else:
+        live   = {info['key'] for info in manifest['shards'].values()}
+        wanted = {manifest['shards'][y]['key']: (lambda k=manifest['shards'][y]['key']: read_shard(store, k))
+                  for y in shard_years(manifest, since, until)}
+
+    conn   = _connect_index_db(store)
+    loaded = {k for (k,) in conn.execute("SELECT key FROM shards")}
+    stale, missing = loaded - live, set(wanted) - loaded
+    if stale or missing:
+        with conn:
+            for key in stale:
+                conn.execute("DELETE FROM entries WHERE shard = ?", (key,))
+                conn.execute("DELETE FROM shards WHERE key = ?", (key,))
+            for key in missing:
+                conn.executemany(
+                    "INSERT INTO entries (shard, date, key, title, summary, member, offset, length, codec, zdict)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((key, e.get('date', ''), e.get('key', ''), e.get('title', ''), e.get('summary', ''),
+                      e.get('member'), e.get('offset'), e.get('length'), e.get('codec'), e.get('zdict'))
+                     for e in wanted[key]()))
+                conn.execute("INSERT INTO shards VALUES (?)", (key,))
+    return conn
+
+# ── Archive cache ──────────────────────────────────────────────────────────
+
+def _archive_path(store, entry: dict):
+    # One subdirectory per store, so a local test store never shadows S3
+    url_tag = hashlib.md5(store.url.encode()).hexdigest()[:8]
+    key     = entry['key']
+    if entry.get('member'):
+        return ARCHIVE_CACHE / url_tag / key / entry['member']
+    return ARCHIVE_CACHE / url_tag / (key[:-3] if key.endswith('.gz') else key)
+
+def _cache_read(path):
+    try:
+        text = path.read_text(encoding='utf-8', errors='replace')
+    except FileNotFoundError:
+        return None
+    os.utime(path)   # mtime doubles as last use for LRU trimming
+    return text
+
+def _cache_write(path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return data.decode('utf-8', errors='replace')
+
+def read_archive(store, entry: dict):
+    """Decompressed text of one archived day (an index entry), from the disk cache when possible."""
+    path = _archive_path(store, entry)
+    text = _cache_read(path)
+    if text is not None:
+        return text
+    if entry.get('member'):
+        return _cache_write(path, bundle.read_member(store, entry))
+    data, _ = store.get(entry['key'])
+    return _cache_write(path, gzip.decompress(data) if entry['key'].endswith('.gz') else data)
+
+def read_month(store, key: str, entries):
+    """Fill the cache for several days of one bundle with a single GET of the whole bundle."""
+    for row, raw in bundle.read_bundle(store, key):
+        _cache_write(_archive_path(store, {'key': key, 'member': row['name']}), raw)
+    return {e['member']: read_archive(store, e) for e in entries}
+
+def trim_archive_cache(limit_mb=ARCHIVE_CACHE_MB):
+    """Delete least recently used cached archives until the cache fits in limit_mb."""
+    files = []
+    for path in ARCHIVE_CACHE.rglob('*'):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        if path.is_file():
+            files.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= limit_mb * 1024 * 1024:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+def read_archives(entries, store=None, workers=FETCH_WORKERS):
+    """
+    {(key, member): text} for every index entry that could be read; misses
+    are fetched in parallel, one request per bundle when a bundle has
+    several of them.
+    """
+    store  = store or open_store()
+    texts  = {}
+    groups = {}
+    for e in entries:
+        text = _cache_read(_archive_path(store, e))
+        if text is not None:
+            texts[(e['key'], e.get('member'))] = text
+        else:
+            groups.setdefault(e['key'], []).append(e)
+
+    def fetch(key):
+        wanted = groups[key]
+        try:
+            if len(wanted) > 1 and all(e.get('member') for e in wanted):
+                return {(key, m): t for m, t in read_month(store, key, wanted).items()}
+            return {(key, e.get('member')): read_archive(store, e) for e in wanted}
+        except (KeyError, StoreError, bundle.BundleError, OSError) as e:
+            print(f"[coldstore] Could not read {key}: {e}", file=sys.stderr)
+            return {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for got in pool.map(fetch, groups):
+            texts.update(got)
+    trim_archive_cache()
+    return texts
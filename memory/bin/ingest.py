@@ -3,83 +3,890 @@
 Ingest all memory markdown files into the local SQLite FTS5 hot store.
 Run after writing any new memory file, or daily via cron.
 
-Usage: python3 memory/bin/ingest.py
+Schema: `documents` (one row per file: path, date, title, plus the
+mtime/size/sha256 manifest) → `chunks` (text and byte/line offsets) →
+external-content FTS5 indexes over chunk text only, kept in step by
+triggers. Date and source filters therefore go through B-tree indexes on
+`documents` instead of full-text matching. Older hot.db layouts are
+migrated in place.
+
+Only files whose mtime/size (and then content hash) changed since the last
+run are re-chunked. Files that disappear from disk are tombstoned and
+their chunks removed, except archived days promoted back by tiers.py,
+which never had a file here.
+
+The database runs in WAL mode so search.py readers are never blocked by an
+ingest. Each run writes in a single transaction and then lets FTS5 merge
+its segments; --rebuild builds a fresh, optimized database beside hot.db
+(carrying promoted days over from the live one, since their text only
+exists there) and copies it into hot.db in one locked step, so open
+connections (--watch, the search server) stay valid.
+
+Chunks are cut by a streaming chunker with a hard size limit and overlap,
+and carry their byte and line range in the source file.
+
+--watch keeps the process running after the sync and re-ingests only the
+files that change (inotify on Linux, stat polling elsewhere), publishing
+lag and queue depth to memory/ingest-status.json.
+
+When numpy and sentence-transformers are installed, new chunks are also
+batch-embedded into the `embeddings` table for hybrid search
+(see vectors.py); --no-embed skips this.
+
+Besides the porter index `chunks_fts` (with prefix indexes for partial
+words) a trigram index `chunks_tri` supports substring search over identifiers; --no-trigram
+and --prefix '' skip them, and the size report shows what each costs.
+
+Usage: python3 memory/bin/ingest.py [--full] [--optimize] [--rebuild] [--watch] [--no-embed]
 """
-import sqlite3, os, re, sys
+import sqlite3, os, io, re, sys, json, hashlib, argparse, time, signal
 from datetime import datetime, date
 from pathlib import Path
 
-WORKSPACE   = Path(__file__).resolve().parents[2]
-MEMORY_DIR  = WORKSPACE / 'memory'
-DB_PATH     = MEMORY_DIR / 'hot.db'
-CHUNK_SIZE  = 800   # characters per indexed chunk (overlap is fine)
-
-def chunk_text(text, size=CHUNK_SIZE):
-    """Split text into overlapping chunks for better search coverage."""
-    paragraphs = [p.strip() for p in re.split(r'\n{2,}', text) if p.strip()]
-    chunks, current = [], []
-    length = 0
-    for para in paragraphs:
-        if length + len(para) > size and current:
-            chunks.append('\n\n'.join(current))
-            current, length = [], 0
-        current.append(para)
-        length += len(para)
-    if current:
-        chunks.append('\n\n'.join(current))
-    return chunks or [text[:size]]
-
-def ingest_file(cursor, filepath: Path):
-    source = str(filepath.relative_to(WORKSPACE))
-    text   = filepath.read_text(encoding='utf-8', errors='replace')
+import vectors
+
+WORKSPACE       = Path(__file__).resolve().parents[2]
+MEMORY_DIR      = WORKSPACE / 'memory'
+DB_PATH         = MEMORY_DIR / 'hot.db'
+CHUNK_SIZE      = 800   # hard maximum characters per indexed chunk
+CHUNK_OVERLAP   = 120   # characters repeated from the end of the previous chunk
+CHUNKER_VERSION = 2     # bump when chunk boundaries change so every file re-chunks
+AUTOMERGE       = 8     # FTS5 automerge: segments per level before a background merge
+MERGE_PAGES     = 500   # pages per incremental 'merge' step after an ingest
+EMBED_BATCH     = 512   # chunks per model.encode() call / executemany
+PREFIX_INDEX    = '2 3 4'   # FTS5 prefix= lengths on chunks_fts ('' for none)
+PARALLEL_MIN    = 64    # below this many changed files a process pool costs more than it saves
+STATUS_PATH     = MEMORY_DIR / 'ingest-status.json'   # written by --watch
+DEBOUNCE        = 0.15  # seconds of quiet before a burst of events is ingested
+DEBOUNCE_MAX    = 0.5   # ...but never hold an event longer than this
+POLL_INTERVAL   = 0.25  # stat-scan period when inotify is unavailable
+HEARTBEAT       = 30    # seconds between idle status-file refreshes
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        id         INTEGER PRIMARY KEY,
+        source     TEXT NOT NULL UNIQUE,   -- workspace-relative path
+        date       TEXT NOT NULL,          -- YYYY-MM-DD from the filename, else mtime
+        title      TEXT NOT NULL,
+        mtime_ns   INTEGER NOT NULL,       -- manifest: stat + hash at last index
+        size       INTEGER NOT NULL,
+        sha256     TEXT NOT NULL,
+        chunks     INTEGER NOT NULL DEFAULT 0,
+        indexed_at TEXT NOT NULL,
+        deleted_at TEXT,                   -- tombstone: set when the file vanished
+        promoted_at TEXT                   -- archived day re-hydrated by tiers.py (no file on disk)
+    );
+    CREATE INDEX IF NOT EXISTS documents_date ON documents(date);
+    CREATE TABLE IF NOT EXISTS chunks (
+        id         INTEGER PRIMARY KEY,    -- rowid in the FTS indexes, key of embeddings
+        doc_id     INTEGER NOT NULL REFERENCES documents(id),
+        chunk_idx  INTEGER NOT NULL,
+        content    TEXT NOT NULL,
+        byte_start INTEGER NOT NULL,       -- half-open byte range in the source file
+        byte_end   INTEGER NOT NULL,
+        line_start INTEGER NOT NULL,       -- 1-based inclusive line range
+        line_end   INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_id, chunk_idx);
+    CREATE TABLE IF NOT EXISTS embeddings (
+        chunk_id   INTEGER PRIMARY KEY,    -- chunks.id
+        model      TEXT NOT NULL,
+        vec        BLOB NOT NULL           -- little-endian float32, L2-normalised
+    );
+    CREATE TRIGGER IF NOT EXISTS chunks_ad_embeddings AFTER DELETE ON chunks BEGIN
+        DELETE FROM embeddings WHERE chunk_id = old.id;
+    END;
+    CREATE TABLE IF NOT EXISTS meta (
+        key   TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+"""
+
+# External-content FTS5 indexes over chunks.content: they store postings
+# only, and triggers on `chunks` keep them in step with every write.
+FTS_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5(
+        content,
+        content='chunks',
+        content_rowid='id',
+        tokenize='{tokenize}'{prefix}
+    );
+    CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON chunks BEGIN
+        INSERT INTO {name} (rowid, content) VALUES (new.id, new.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON chunks BEGIN
+        INSERT INTO {name} ({name}, rowid, content) VALUES ('delete', old.id, old.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF content ON chunks BEGIN
+        INSERT INTO {name} ({name}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {name} (rowid, content) VALUES (new.id, new.content);
+    END;
+"""
+
+def split_long(text, limit):
+    """Cut one line into pieces of at most `limit` chars, preferring whitespace."""
+    while len(text) > limit:
+        cut = text.rfind(' ', limit // 2, limit)
+        cut = cut + 1 if cut != -1 else limit
+        yield text[:cut]
+        text = text[cut:]
+    if text:
+        yield text
+
+def iter_chunks(lines, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Stream chunks out of an iterable of raw byte lines (e.g. an open file).
+
+    Yields (text, byte_start, byte_end, line_start, line_end) where the byte
+    range is half-open into the file and lines are 1-based and inclusive.
+    Chunks break at blank lines where possible, never exceed `size` chars
+    (over-long lines are split), and each one repeats up to `overlap` chars
+    from the end of the previous chunk so phrases straddling a boundary stay
+    matchable.
+    """
+    if not 0 <= overlap < size // 2:
+        raise ValueError(f"overlap must be in [0, {size // 2}), got {overlap}")
+    buf     = []   # pieces: [text, byte_start, byte_end, line]
+    buf_len = 0
+    carried = 0    # leading pieces of buf repeated from the previous chunk
+    brk     = 0    # index in buf just after the latest blank line
+    offset  = 0
+
+    def emit(pieces):
+        text = ''.join(p[0] for p in pieces)
+        return (text.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace').strip(),
+                pieces[0][1], pieces[-1][2], pieces[0][3], pieces[-1][3])
+
+    def tail_of(pieces):
+        """Last <= overlap chars of `pieces`, starting on a word boundary."""
+        tail, budget = [], overlap
+        for text, b0, b1, line in reversed(pieces):
+            if len(text) <= budget:
+                tail.insert(0, [text, b0, b1, line])
+                budget -= len(text)
+                continue
+            if budget:
+                cut = text.find(' ', len(text) - budget)
+                if cut != -1 and cut + 1 < len(text):
+                    part = text[cut + 1:]
+                    tail.insert(0, [part, b1 - len(part.encode('utf-8', 'surrogateescape')), b1, line])
+            break
+        return tail
+
+    for lineno, raw in enumerate(lines, 1):
+        line = raw.decode('utf-8', 'surrogateescape')
+        for piece in split_long(line, size - overlap):
+            nbytes = len(piece.encode('utf-8', 'surrogateescape'))
+            entry  = [piece, offset, offset + nbytes, lineno]
+            offset += nbytes
+            while buf_len + len(piece) > size and len(buf) > carried:
+                # Prefer ending the chunk at the last paragraph break
+                cut = brk if carried < brk < len(buf) else len(buf)
+                head, rest = buf[:cut], buf[cut:]
+                if ''.join(p[0] for p in head[carried:]).strip():
+                    yield emit(head)
+                tail = tail_of(head[carried:])
+                if tail and tail[0][1] <= head[carried][1]:
+                    tail = tail[1:]   # never restart a chunk where the last one began
+                if sum(len(p[0]) for p in tail + rest) > size:
+                    tail = []
+                buf, carried, brk = tail + rest, len(tail), 0
+                buf_len = sum(len(p[0]) for p in buf)
+            buf.append(entry)
+            buf_len += len(piece)
+            if not piece.strip():
+                brk = len(buf)
+    if len(buf) > carried and ''.join(p[0] for p in buf[carried:]).strip():
+        yield emit(buf)
+
+def source_of(filepath: Path):
+    return str(filepath.relative_to(WORKSPACE))
+
+def scan(f, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Hash, title-sniff and chunk one binary stream → (sha256, title or None, chunks)."""
+    hasher = hashlib.sha256()
+    title  = None
+
+    def lines():
+        nonlocal title
+        for raw in f:
+            hasher.update(raw)
+            if title is None:
+                # First H1/H2 becomes the title
+                m = re.match(r'#{1,2}\s+(.+)$', raw.decode('utf-8', 'replace').rstrip('\r\n'))
+                title = m.group(1) if m else None
+            yield raw
+
+    chunks = list(iter_chunks(lines(), size, overlap))
+    return hasher.hexdigest(), title, chunks
+
+def parse_file(filepath: Path, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Stream one file through the hasher, title sniffer and chunker. Pure (no
+    database access) so it can run in a worker process; the result is handed
+    to the single writer.
+    """
+    st = filepath.stat()
+    with filepath.open('rb') as f:
+        sha256, title, chunks = scan(f, size, overlap)
 
     # Extract date from filename (YYYY-MM-DD.md) or use file mtime
     m = re.search(r'(\d{4}-\d{2}-\d{2})', filepath.name)
-    doc_date = m.group(1) if m else date.fromtimestamp(filepath.stat().st_mtime).isoformat()
+    doc_date = m.group(1) if m else date.fromtimestamp(st.st_mtime).isoformat()
+
+    return {
+        'source':   source_of(filepath),
+        'mtime_ns': st.st_mtime_ns,
+        'size':     st.st_size,
+        'sha256':   sha256,
+        'date':     doc_date,
+        'title':    title or filepath.stem,
+        'chunks':   chunks,   # (text, byte_start, byte_end, line_start, line_end)
+    }
 
-    # Extract a title (first H1/H2 or filename)
-    title_m = re.search(r'^#{1,2}\s+(.+)$', text, re.MULTILINE)
-    title   = title_m.group(1) if title_m else filepath.stem
+def parse_bytes(filepath: Path, raw: bytes, doc_date: str, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """parse_file() for content with no file behind it: an archived day being promoted."""
+    sha256, title, chunks = scan(io.BytesIO(raw), size, overlap)
+    return {
+        'source':   source_of(filepath),
+        'mtime_ns': 0,
+        'size':     len(raw),
+        'sha256':   sha256,
+        'date':     doc_date,
+        'title':    title or filepath.stem,
+        'chunks':   chunks,
+    }
+
+def doc_row(cursor, source):
+    """Manifest view of a document: (mtime_ns, size, sha256, deleted_at, id) or None."""
+    return cursor.execute(
+        "SELECT mtime_ns, size, sha256, deleted_at, id FROM documents WHERE source = ?", (source,)
+    ).fetchone()
+
+def is_unchanged(row, filepath: Path, force=False):
+    """Fast path: a live document with identical stat means no read, no hash."""
+    if not row or force or row[3] is not None:
+        return False
+    st = filepath.stat()
+    return row[0] == st.st_mtime_ns and row[1] == st.st_size
+
+def bump_generation(cursor, floor=0):
+    """
+    Advance meta.generation, the counter search.py --serve uses to invalidate
+    its result cache. Call inside the transaction that changes what searches
+    would return; `floor` carries the count over into a rebuilt database.
+    """
+    cursor.execute("""
+        INSERT INTO meta (key, value) VALUES ('generation', ?)
+        ON CONFLICT(key) DO UPDATE SET value = max(CAST(value AS INTEGER), ?) + 1
+    """, (floor + 1, floor))
+
+def read_generation(path: Path):
+    """Current generation of the database at `path` (0 if absent)."""
+    if not path.exists():
+        return 0
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    conn.close()
+    return int(row[0]) if row else 0
 
-    # Remove existing entries for this source
-    cursor.execute("DELETE FROM memory WHERE source = ?", (source,))
+def has_table(cursor, name):
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
 
-    for i, chunk in enumerate(chunk_text(text)):
+def write_parsed(cursor, doc, row, force=False):
+    """
+    Writer side: apply one parse_file() result to hot.db.
+    Returns 'touched' (stat changed, content identical) or 'updated'.
+    """
+    source = doc['source']
+    if row and not force and row[3] is None and row[2] == doc['sha256']:
         cursor.execute(
-            "INSERT INTO memory (date, source, title, chunk_idx, content) VALUES (?,?,?,?,?)",
-            (doc_date, source, title, i, chunk)
+            "UPDATE documents SET mtime_ns = ?, size = ?, promoted_at = NULL WHERE id = ?",
+            (doc['mtime_ns'], doc['size'], row[4])
         )
+        return 'touched'
 
-def main():
-    conn = sqlite3.connect(DB_PATH)
-    cur  = conn.cursor()
-
-    cur.executescript("""
-        CREATE VIRTUAL TABLE IF NOT EXISTS memory USING fts5(
-            date,
-            source,
-            title,
-            chunk_idx UNINDEXED,
-            content,
-            tokenize='porter ascii'
-        );
-    """)
-
-    ingested = 0
-    # Ingest MEMORY.md
+    cursor.execute("""
+        INSERT INTO documents (source, date, title, mtime_ns, size, sha256, chunks, indexed_at, deleted_at)
+        VALUES (?,?,?,?,?,?,?,?,NULL)
+        ON CONFLICT(source) DO UPDATE SET
+            date = excluded.date, title = excluded.title,
+            mtime_ns = excluded.mtime_ns, size = excluded.size, sha256 = excluded.sha256,
+            chunks = excluded.chunks, indexed_at = excluded.indexed_at, deleted_at = NULL,
+            promoted_at = NULL
+    """, (source, doc['date'], doc['title'], doc['mtime_ns'], doc['size'], doc['sha256'],
+          len(doc['chunks']), datetime.now().isoformat(timespec='seconds')))
+    doc_id = row[4] if row else cursor.execute(
+        "SELECT id FROM documents WHERE source = ?", (source,)
+    ).fetchone()[0]
+
+    # Replace the chunks; triggers update the FTS indexes and drop stale vectors
+    # (new chunks are embedded later, in one batch)
+    cursor.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+    cursor.executemany(
+        "INSERT INTO chunks (doc_id, chunk_idx, content, byte_start, byte_end, line_start, line_end)"
+        " VALUES (?,?,?,?,?,?,?)",
+        [(doc_id, i, *chunk) for i, chunk in enumerate(doc['chunks'])]
+    )
+    return 'updated'
+
+def sync_file(cursor, filepath: Path, force=False, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Bring one file's index entries up to date with hot.db, in-process.
+    Returns 'skipped', 'touched' or 'updated'.
+    """
+    row = doc_row(cursor, source_of(filepath))
+    if is_unchanged(row, filepath, force):
+        return 'skipped'
+    return write_parsed(cursor, parse_file(filepath, size, overlap), row, force)
+
+def parse_all(paths, jobs=1, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Yield parse_file() results for `paths`. With jobs > 1 and enough files,
+    reading and chunking fan out over a process pool while results stream
+    back in order to the caller, which stays the only SQLite writer.
+    """
+    if jobs <= 1 or len(paths) < PARALLEL_MIN:
+        for p in paths:
+            yield parse_file(p, size, overlap)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(partial(parse_file, size=size, overlap=overlap), paths,
+                            chunksize=max(1, len(paths) // (jobs * 8)))
+
+def tombstone(cursor, source: str):
+    """Drop one vanished file's chunks; keep its document row as a tombstone."""
+    cursor.execute(
+        "DELETE FROM chunks WHERE doc_id = (SELECT id FROM documents WHERE source = ?)", (source,)
+    )
+    cursor.execute(
+        "UPDATE documents SET chunks = 0, deleted_at = ? WHERE source = ? AND deleted_at IS NULL",
+        (datetime.now().isoformat(timespec='seconds'), source)
+    )
+
+def tombstone_missing(cursor, seen: set):
+    """Tombstone every live document whose file is gone (promoted days never had one)."""
+    live    = cursor.execute(
+        "SELECT source FROM documents WHERE deleted_at IS NULL AND promoted_at IS NULL"
+    ).fetchall()
+    removed = 0
+    for (source,) in live:
+        if source not in seen:
+            tombstone(cursor, source)
+            removed += 1
+    return removed
+
+def embed_missing(conn):
+    """
+    Batch-embed every chunk that has no vector for the current model yet.
+    Runs after the text sync, so one model pass covers all changed files.
+    Returns the number of chunks embedded.
+    """
+    conn.execute("DELETE FROM embeddings WHERE model != ?", (vectors.MODEL_NAME,))
+    todo = conn.execute("""
+        SELECT id, content FROM chunks
+        WHERE id NOT IN (SELECT chunk_id FROM embeddings)
+    """).fetchall()
+    for i in range(0, len(todo), EMBED_BATCH):
+        batch = todo[i:i + EMBED_BATCH]
+        vecs  = vectors.encode(content for _, content in batch)
+        conn.executemany(
+            "INSERT INTO embeddings (chunk_id, model, vec) VALUES (?,?,?)",
+            [(chunk_id, vectors.MODEL_NAME, vectors.to_blob(v))
+             for (chunk_id, _), v in zip(batch, vecs)]
+        )
+    if todo:
+        bump_generation(conn)
+    conn.commit()
+    return len(todo)
+
+def want_embeddings(flag):
+    """--embed/--no-embed, defaulting to 'on when the optional deps are installed'."""
+    if flag is False:
+        return False
+    if vectors.available():
+        return True
+    if flag:
+        print("[ingest] --embed needs numpy and sentence-transformers; skipping vectors",
+              file=sys.stderr)
+    return False
+
+def migrate_legacy(conn):
+    """
+    Convert the single-table layout (an FTS5 `memory` table holding date,
+    source and title on every chunk, plus `manifest`) into documents/chunks.
+    Chunk ids keep the old rowids so stored embeddings carry over. Layouts
+    too old to have offsets or a manifest are simply dropped and re-chunked.
+    """
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(memory)")]
+    if 'line_start' in cols and has_table(conn, 'manifest'):
+        print("[ingest] Migrating hot.db to the documents/chunks layout")
+        if has_table(conn, 'embeddings'):
+            conn.execute("ALTER TABLE embeddings RENAME TO embeddings_legacy")
+        conn.executescript(SCHEMA)
+        conn.execute("""
+            INSERT INTO documents (source, date, title, mtime_ns, size, sha256, chunks, indexed_at, deleted_at)
+            SELECT m.path, coalesce(c.date, substr(m.indexed_at, 1, 10)), coalesce(c.title, m.path),
+                   m.mtime_ns, m.size, m.sha256, m.chunks, m.indexed_at, m.deleted_at
+            FROM manifest m
+            LEFT JOIN (SELECT source, min(date) AS date, min(title) AS title
+                       FROM memory GROUP BY source) c ON c.source = m.path
+        """)
+        conn.execute("""
+            INSERT INTO chunks (id, doc_id, chunk_idx, content, byte_start, byte_end, line_start, line_end)
+            SELECT m.rowid, d.id, m.chunk_idx, m.content, m.byte_start, m.byte_end, m.line_start, m.line_end
+            FROM memory m JOIN documents d ON d.source = m.source
+        """)
+        if has_table(conn, 'embeddings_legacy'):
+            conn.execute("""
+                INSERT INTO embeddings (chunk_id, model, vec)
+                SELECT chunk_rowid, model, vec FROM embeddings_legacy
+                WHERE chunk_rowid IN (SELECT id FROM chunks)
+            """)
+    else:
+        print("[ingest] Dropping pre-manifest hot.db layout; every file will be re-chunked")
+        conn.execute("DROP TABLE IF EXISTS embeddings")
+    for table in ('memory_tri', 'memory', 'manifest', 'embeddings_legacy'):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.executescript(SCHEMA)
+    conn.execute("DELETE FROM meta WHERE key = 'memory_ddl'")
+    conn.commit()
+
+def migrate_columns(conn):
+    """Add columns introduced after a hot.db was created."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+    if 'promoted_at' not in columns:
+        conn.execute("ALTER TABLE documents ADD COLUMN promoted_at TEXT")
+
+def ensure_fts(conn, name, tokenize, prefix='', wanted=True):
+    """
+    Create, recreate or drop one FTS index so it matches the requested
+    options. A (re)created index is filled from `chunks` in one 'rebuild';
+    chunk text itself is never touched, so changing prefix= or toggling the
+    trigram index costs no re-chunking. Returns True if anything changed.
+    """
+    ddl = FTS_DDL.format(name=name, tokenize=tokenize,
+                         prefix=f",\n        prefix='{prefix}'" if prefix.strip() else '')
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (f'ddl:{name}',)).fetchone()
+    if has_table(conn, name) and (not wanted or row is None or row[0] != ddl):
+        for suffix in ('ai', 'ad', 'au'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}_{suffix}")
+        conn.execute(f"DROP TABLE {name}")
+        conn.execute("DELETE FROM meta WHERE key = ?", (f'ddl:{name}',))
+        changed = True
+    else:
+        changed = False
+    if wanted and not has_table(conn, name):
+        conn.executescript(ddl)
+        conn.execute(f"INSERT INTO {name}({name}) VALUES('rebuild')")
+        conn.execute(f"INSERT INTO {name}({name}, rank) VALUES('automerge', ?)", (AUTOMERGE,))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f'ddl:{name}', ddl))
+        changed = True
+    return changed
+
+def connect(path: Path, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, prefix=PREFIX_INDEX, trigram=True):
+    """
+    Open hot.db for writing: WAL journal, relaxed fsync, schema ensured,
+    legacy layouts migrated and FTS indexes matched to `prefix`/`trigram`.
+    A change of chunker settings invalidates the manifest so the next sync
+    re-chunks every file.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if has_table(conn, 'memory'):
+        migrate_legacy(conn)
+    conn.executescript(SCHEMA)
+    migrate_columns(conn)
+    if (ensure_fts(conn, 'chunks_fts', 'porter ascii', prefix)
+            | ensure_fts(conn, 'chunks_tri', 'trigram', wanted=trigram)):
+        bump_generation(conn)
+
+    chunker = f"v{CHUNKER_VERSION}:{size}:{overlap}"
+    row = conn.execute("SELECT value FROM meta WHERE key = 'chunker'").fetchone()
+    if row and row[0] != chunker:
+        print(f"[ingest] Chunker changed ({row[0]} → {chunker}); re-chunking all files")
+        conn.execute("UPDATE documents SET mtime_ns = -1, sha256 = ''")
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('chunker', ?)", (chunker,))
+    conn.commit()
+    return conn
+
+def fts_tables(conn):
+    return [t for t in ('chunks_fts', 'chunks_tri') if has_table(conn, t)]
+
+def merge_segments(conn, optimize=False):
+    """
+    Fold FTS5 b-tree segments together so queries touch fewer of them.
+    'optimize' merges everything into one segment (best after a rebuild);
+    otherwise run bounded 'merge' steps until FTS5 reports nothing left to do.
+    """
+    for table in fts_tables(conn):
+        if optimize:
+            conn.execute(f"INSERT INTO {table}({table}) VALUES('optimize')")
+            continue
+        while True:
+            before = conn.total_changes
+            conn.execute(f"INSERT INTO {table}({table}, rank) VALUES('merge', ?)", (MERGE_PAGES,))
+            if conn.total_changes - before < 2:
+                break
+    conn.commit()
+
+def size_report(conn):
+    page_size  = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages      = conn.execute("PRAGMA page_count").fetchone()[0]
+    free       = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    docs       = conn.execute("SELECT count(*) FROM documents WHERE deleted_at IS NULL").fetchone()[0]
+    chunks     = conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+    segments   = conn.execute("SELECT count(*) FROM chunks_fts_idx").fetchone()[0]
+    text       = conn.execute("SELECT coalesce(sum(length(content)), 0) FROM chunks").fetchone()[0]
+    indexes    = []
+    for table in fts_tables(conn):
+        kib = conn.execute(f"SELECT coalesce(sum(length(block)), 0) FROM {table}_data").fetchone()[0] / 1024
+        indexes.append(f"{table} {kib:.0f} KiB ({kib * 1024 / max(text, 1):.0%} of text)")
+    vec_kib    = conn.execute("SELECT coalesce(sum(length(vec)), 0) FROM embeddings").fetchone()[0] / 1024
+    return (f"{docs} documents, {chunks} chunks ({text / 1024:.0f} KiB text), {segments} index segment rows; "
+            f"indexes: {', '.join(indexes)}, embeddings {vec_kib:.0f} KiB; "
+            f"file {pages * page_size / 1024:.0f} KiB ({free * page_size / 1024:.0f} KiB free)")
+
+def carry_promoted(conn, live: Path = DB_PATH):
+    """
+    Copy promoted days (documents, chunks and embeddings) from the live
+    hot.db into a database being rebuilt → the number copied. They have no
+    file to re-read, so a rebuild would otherwise drop them; their chunks
+    keep the chunking they were promoted with, and promoted_at keeps their
+    expiry clock. Days whose file is back on disk were already ingested.
+    """
+    if not live.exists():
+        return 0
+    conn.execute("ATTACH DATABASE ? AS live", (str(live),))
+    try:
+        if 'promoted_at' not in {row[1] for row in conn.execute("PRAGMA live.table_info(documents)")}:
+            return 0
+        docs = conn.execute("""
+            SELECT id, source, date, title, mtime_ns, size, sha256, chunks, indexed_at, promoted_at
+            FROM live.documents
+            WHERE promoted_at IS NOT NULL AND deleted_at IS NULL
+              AND source NOT IN (SELECT source FROM main.documents)
+        """).fetchall()
+        for old_id, *row in docs:
+            doc_id = conn.execute(
+                "INSERT INTO documents (source, date, title, mtime_ns, size, sha256, chunks, indexed_at, promoted_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row).lastrowid
+            chunks = conn.execute(
+                "SELECT id, chunk_idx, content, byte_start, byte_end, line_start, line_end"
+                " FROM live.chunks WHERE doc_id = ? ORDER BY chunk_idx", (old_id,)).fetchall()
+            for old_chunk, *chunk in chunks:
+                chunk_id = conn.execute(
+                    "INSERT INTO chunks (doc_id, chunk_idx, content, byte_start, byte_end, line_start, line_end)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", (doc_id, *chunk)).lastrowid
+                conn.execute("INSERT INTO embeddings (chunk_id, model, vec)"
+                             " SELECT ?, model, vec FROM live.embeddings WHERE chunk_id = ?", (chunk_id, old_chunk))
+        conn.commit()
+        return len(docs)
+    finally:
+        conn.execute("DETACH DATABASE live")
+
+def swap_in(tmp_path: Path):
+    """
+    Replace hot.db's contents with a freshly built database. The pages are
+    copied in with SQLite's backup API under hot.db's write lock rather than
+    renamed over it: a --watch process (or search server) holding hot.db
+    open keeps a valid file and WAL, and simply sees the new contents at its
+    next transaction. Renaming would leave it writing into an orphaned inode
+    whose -wal/-shm the new file then inherits.
+    """
+    src = sqlite3.connect(tmp_path)
+    src.execute("VACUUM")
+    if not DB_PATH.exists():
+        src.execute("PRAGMA journal_mode=DELETE")   # no sidecar to leave behind
+        src.close()
+        os.replace(tmp_path, DB_PATH)
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+        return
+    dst = sqlite3.connect(DB_PATH, timeout=60)   # waits out a watcher batch in progress
+    try:
+        src.backup(dst)
+        dst.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        dst.close()
+        src.close()
+    for path in (tmp_path, Path(f"{tmp_path}-wal"), Path(f"{tmp_path}-shm")):
+        path.unlink(missing_ok=True)
+
+def memory_files():
+    """MEMORY.md plus every memory/*.md file, in ingest order."""
+    files = []
     memory_md = WORKSPACE / 'MEMORY.md'
     if memory_md.exists():
-        ingest_file(cur, memory_md)
-        ingested += 1
+        files.append(memory_md)
+    files.extend(sorted(MEMORY_DIR.glob('*.md')))
+    return files
 
-    # Ingest all memory/*.md files
-    for f in sorted(MEMORY_DIR.glob('*.md')):
-        ingest_file(cur, f)
-        ingested += 1
+def sync_all(conn, jobs=1, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, force=False):
+    """Full manifest sync of every memory file. Returns (counts, removed)."""
+    cur     = conn.cursor()
+    counts  = {'skipped': 0, 'touched': 0, 'updated': 0}
+    seen    = set()
+    pending = []   # (path, document row) for files whose stat changed
+    for f in memory_files():
+        source = source_of(f)
+        seen.add(source)
+        row = doc_row(cur, source)
+        if is_unchanged(row, f, force=force):
+            counts['skipped'] += 1
+        else:
+            pending.append((f, row))
 
+    for (f, row), doc in zip(pending, parse_all([f for f, _ in pending], jobs, size, overlap)):
+        counts[write_parsed(cur, doc, row, force=force)] += 1
+    removed = tombstone_missing(cur, seen)
+    if counts['updated'] or removed:
+        bump_generation(cur)
     conn.commit()
+    return counts, removed
+
+# ── Watch mode ─────────────────────────────────────────────────────────────
+
+def is_memory_file(path: Path):
+    return path == WORKSPACE / 'MEMORY.md' or (path.parent == MEMORY_DIR and path.suffix == '.md')
+
+class InotifyWatcher:
+    """
+    Linux inotify via ctypes (no third-party deps). Directories are watched
+    rather than files so editors that save by rename are still seen.
+    """
+    name = 'inotify'
+    MASK = 0x008 | 0x040 | 0x080 | 0x200   # CLOSE_WRITE | MOVED_FROM | MOVED_TO | DELETE
+
+    def __init__(self, dirs):
+        import ctypes, ctypes.util
+        libc    = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        for d in dirs:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(d), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {d}')
+            self.dirs[wd] = d
+
+    def read(self, timeout):
+        """Block up to `timeout` seconds; return the paths that changed."""
+        import select, struct
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        buf, paths, i = os.read(self.fd, 64 * 1024), [], 0
+        while i < len(buf):
+            wd, _mask, _cookie, length = struct.unpack_from('iIII', buf, i)
+            name = buf[i + 16:i + 16 + length].rstrip(b'\0')
+            i   += 16 + length
+            if name and wd in self.dirs:
+                paths.append(self.dirs[wd] / os.fsdecode(name))
+        return paths
+
+class PollWatcher:
+    """Portable fallback (e.g. macOS): diff a stat snapshot every POLL_INTERVAL."""
+    name = 'poll'
+
+    def __init__(self, dirs):
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snap = {}
+        for f in memory_files():
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            snap[f] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def read(self, timeout):
+        time.sleep(min(timeout, POLL_INTERVAL))
+        new, old = self.scan(), self.snapshot
+        self.snapshot = new
+        return [p for p in new.keys() | old.keys() if new.get(p) != old.get(p)]
+
+def write_status(status: dict):
+    """Atomically publish the watcher's state for health checks."""
+    status['updated_at'] = datetime.now().isoformat(timespec='milliseconds')
+    tmp = STATUS_PATH.with_name(STATUS_PATH.name + '.tmp')
+    tmp.write_text(json.dumps(status, indent=2))
+    os.replace(tmp, STATUS_PATH)
+
+def watch(open_db, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, embed=False):
+    """
+    Re-ingest memory files as they change. Events are debounced (a burst of
+    saves becomes one batch, flushed after DEBOUNCE of quiet or DEBOUNCE_MAX
+    after the first event) and only the touched files are re-chunked.
+    `open_db()` opens hot.db; it is called again before a batch whenever
+    hot.db's inode has changed (deleted and recreated, restored from a
+    backup), so the watcher never writes into an orphaned file.
+    """
+    dirs = [MEMORY_DIR, WORKSPACE]   # WORKSPACE only for MEMORY.md
+    try:
+        watcher = InotifyWatcher(dirs) if sys.platform.startswith('linux') else PollWatcher(dirs)
+    except OSError as e:
+        print(f"[ingest] inotify unavailable ({e}); falling back to polling", file=sys.stderr)
+        watcher = PollWatcher(dirs)
+
+    conn, inode = None, None
+
+    def connection():
+        nonlocal conn, inode
+        try:
+            current = DB_PATH.stat().st_ino
+        except FileNotFoundError:
+            current = None
+        if conn is None or current != inode:
+            if conn is not None:
+                conn.close()
+                print("[ingest] hot.db was replaced; reopening", file=sys.stderr)
+            conn  = open_db()
+            inode = DB_PATH.stat().st_ino
+        return conn
+
+    pending = {}   # path -> monotonic time of its first unflushed event
+    status  = {
+        'pid': os.getpid(), 'backend': watcher.name,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'queue_depth': 0, 'batches': 0, 'files_ingested': 0,
+        'last_lag_ms': None, 'max_lag_ms': 0, 'last_batch_at': None,
+    }
+    write_status(status)
+    print(f"[ingest] Watching {MEMORY_DIR} and MEMORY.md ({watcher.name}); Ctrl-C to stop")
+
+    connection()   # open now, so a broken hot.db fails at startup rather than on the first save
+    last_status = last_event = time.monotonic()
+    try:
+        while True:
+            # Wake for whichever debounce deadline comes first; the watcher may also
+            # wake early for unrelated files (hot.db-wal, the status file itself)
+            now = time.monotonic()
+            if pending:
+                oldest  = min(pending.values())
+                timeout = max(0.0, min(last_event + DEBOUNCE, oldest + DEBOUNCE_MAX) - now)
+            else:
+                timeout = HEARTBEAT
+            changed = [p for p in watcher.read(timeout) if is_memory_file(p)]
+            now     = time.monotonic()
+            for p in changed:
+                pending.setdefault(p, now)
+            if changed:
+                last_event = now
+            status['queue_depth'] = len(pending)
+
+            oldest  = min(pending.values(), default=now)
+            flushed = False
+            if pending and (now - last_event >= DEBOUNCE or now - oldest >= DEBOUNCE_MAX):
+                results = {'updated': 0, 'touched': 0, 'skipped': 0, 'removed': 0}
+                conn = connection()
+                cur  = conn.cursor()
+                for p in sorted(pending):
+                    if p.exists():
+                        results[sync_file(cur, p, size=size, overlap=overlap)] += 1
+                    else:
+                        tombstone(cur, source_of(p))
+                        results['removed'] += 1
+                if results['updated'] or results['removed']:
+                    bump_generation(cur)
+                conn.commit()
+                if embed and results['updated']:
+                    embed_missing(conn)
+                lag_ms = (time.monotonic() - oldest) * 1000
+                status.update(
+                    queue_depth=0, batches=status['batches'] + 1,
+                    files_ingested=status['files_ingested'] + results['updated'] + results['removed'],
+                    last_lag_ms=round(lag_ms, 1), max_lag_ms=round(max(status['max_lag_ms'], lag_ms), 1),
+                    last_batch_at=datetime.now().isoformat(timespec='milliseconds'),
+                )
+                pending.clear()
+                flushed = True
+                print(f"[ingest] {results['updated']} updated, {results['removed']} removed, "
+                      f"lag {lag_ms:.0f} ms")
+
+            if changed or flushed or now - last_status >= HEARTBEAT:
+                write_status(status)
+                last_status = now
+    finally:
+        if conn is not None:
+            conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Index memory files into hot.db')
+    parser.add_argument('--full', action='store_true',
+                        help='Re-chunk every file even if the manifest says it is unchanged')
+    parser.add_argument('--optimize', action='store_true',
+                        help="Run FTS5 'optimize' (single segment) instead of incremental merges")
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Build a fresh database next to hot.db and copy it into hot.db in one locked step')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Hard maximum characters per chunk (default {CHUNK_SIZE})')
+    parser.add_argument('--overlap', type=int, default=CHUNK_OVERLAP,
+                        help=f'Characters shared between consecutive chunks (default {CHUNK_OVERLAP})')
+    parser.add_argument('--trigram', action=argparse.BooleanOptionalAction, default=True,
+                        help='Maintain the trigram substring index chunks_tri (default on)')
+    parser.add_argument('--prefix', default=PREFIX_INDEX, metavar='"N N …"',
+                        help=f"FTS5 prefix index lengths for the porter index, '' to skip "
+                             f"(default '{PREFIX_INDEX}')")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes for reading/chunking changed files (default: all cores)')
+    parser.add_argument('--watch', action='store_true',
+                        help=f'After syncing, keep running and re-ingest files as they change '
+                             f'(status in {STATUS_PATH.name})')
+    parser.add_argument('--embed', action=argparse.BooleanOptionalAction, default=None,
+                        help='Embed new chunks for hybrid search (default: on if sentence-transformers '
+                             'and numpy are installed)')
+    args = parser.parse_args()
+    args.embed = want_embeddings(args.embed)
+    if args.watch and args.rebuild:
+        parser.error('--watch cannot be combined with --rebuild')
+
+    t0 = time.perf_counter()
+    if args.rebuild:
+        target = DB_PATH.with_name(DB_PATH.name + '.rebuild')
+        for leftover in (target, Path(f"{target}-wal"), Path(f"{target}-shm")):
+            leftover.unlink(missing_ok=True)
+    else:
+        target = DB_PATH
+    conn = connect(target, args.chunk_size, args.overlap, args.prefix, args.trigram)
+    if args.rebuild:
+        bump_generation(conn, floor=read_generation(DB_PATH))
+    counts, removed = sync_all(conn, args.jobs, args.chunk_size, args.overlap, force=args.full)
+    if args.rebuild and (carried := carry_promoted(conn)):
+        print(f"[ingest] Carried {carried} promoted day(s) over from {DB_PATH.name}")
+    embedded = embed_missing(conn) if args.embed else 0
+
+    if counts['updated'] or removed or args.optimize or args.rebuild:
+        merge_segments(conn, optimize=args.optimize or args.rebuild)
+    report = size_report(conn)
     conn.close()
-    print(f"[ingest] Indexed {ingested} files into {DB_PATH}")
+    if args.rebuild:
+        swap_in(target)
+
+    ms = (time.perf_counter() - t0) * 1000
+    print(f"[ingest] {counts['updated']} updated, {counts['skipped'] + counts['touched']} skipped, "
+          f"{removed} removed, {embedded} embedded in {ms:.0f} ms → {DB_PATH}")
+    print(f"[ingest] {report}")
+
+    if args.watch:
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))   # run the finally on kill
+        try:
+            watch(lambda: connect(DB_PATH, args.chunk_size, args.overlap, args.prefix, args.trigram),
+                  args.chunk_size, args.overlap, embed=args.embed)
+        except KeyboardInterrupt:
+            print("\n[ingest] Watch stopped")
 
 if __name__ == '__main__':
     main()
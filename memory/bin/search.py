@@ -2,81 +2,580 @@
 """
 Search conversation memory — hot tier (SQLite FTS5) first, cold tier (S3) if sparse.
 
+The hot tier is hybrid when ingest.py has stored chunk embeddings: BM25
+(FTS5 rank) and cosine similarity each produce a ranked candidate list and
+the two are fused with reciprocal rank fusion, so "payment webhook" also
+finds notes that only say "checkout.session.completed". Without numpy and
+sentence-transformers it is BM25 only.
+
+Identifier-like queries (price_1T3M, ERR-403, a Lambda request id) are
+routed to the trigram index `chunks_tri`, which matches any substring;
+prose goes to the porter-stemmed index, whose prefix indexes make `depl*`
+style partial words cheap.
+
+--since/--until/--source narrow results through the B-tree indexes on the
+`documents` table rather than through full-text matching.
+
+`--serve` runs a long-lived server on memory/search.sock that keeps the
+SQLite connection, embedding model and vector matrix warm and caches
+results in an LRU keyed by ingest.py's generation counter. Ordinary
+invocations try the socket first and fall back to searching in-process
+when no server is running.
+
+The cold index is fetched through coldstore.py, which caches it locally,
+revalidates it with an ETag at most every few minutes, and keeps an FTS5
+copy of titles and summaries so cold hits come back BM25-ranked.
+
+Both tiers start together: cold search runs in a background thread while
+the hot tier answers, and is waited on (up to --deadline seconds from the
+start of the query) only when its results are wanted. Late cold results are
+dropped and the answer is flagged partial; errors from an unwanted
+speculative search are dropped silently too.
+
+`--deep` searches the full text of archived days rather than their
+summaries: the newest DEEP_CANDIDATES days in the date range are read
+(through coldstore's local LRU cache) and ranked with an in-memory FTS5
+index. Narrow it with --since/--until to reach further back. Fetching
+uncached archives is slow, so --deep waits DEEP_DEADLINE by default.
+
+Archived days that keep coming back as cold hits are promoted into hot.db
+(tiers.py) after the answer is printed.
+
 Usage:
   python3 memory/bin/search.py "stripe webhook"
   python3 memory/bin/search.py "stripe webhook" --limit 10
   python3 memory/bin/search.py "stripe webhook" --cold    # force include S3 search
+  python3 memory/bin/search.py "stripe webhook" --deep    # full text of archived days, not summaries
+  python3 memory/bin/search.py "stripe webhook" --region  # print each hit's full chunk from disk
+  python3 memory/bin/search.py "stripe webhook" --mode lexical   # BM25 only (or: vector, hybrid)
+  python3 memory/bin/search.py "stripe webhook" --since 2026-02-01 --source memory/
+  python3 memory/bin/search.py --serve                    # warm server; later calls use it
+  printf 'stripe\n{"id": 2, "query": "cron", "limit": 3}\n' | python3 memory/bin/search.py --batch
 
 Output is structured for easy reading mid-session.
 """
-import sqlite3, sys, os, json, gzip, re, argparse
+import sqlite3, sys, os, json, gzip, re, argparse, socket, socketserver, signal, threading, time
+from collections import OrderedDict
 from pathlib import Path
 from datetime import date, timedelta
 
+import coldstore
+import tiers
+import vectors
+
 WORKSPACE  = Path(__file__).resolve().parents[2]
 MEMORY_DIR = WORKSPACE / 'memory'
 DB_PATH    = MEMORY_DIR / 'hot.db'
-S3_BUCKET  = 'pax-memory-sbdz'
 HOT_THRESH = 5   # if fewer than this many hot results, also search cold
+DEADLINE   = 2.0 # seconds a sparse query waits for cold results before reporting partial
+DEEP_DEADLINE = 15.0   # the same for --deep, which may have to download archives first
+DEEP_CANDIDATES = 120   # most recent archived days (after date filters) read by --deep
+RRF_K      = 60  # reciprocal rank fusion damping (standard value from Cormack et al.)
+CANDIDATES = 4   # each retriever contributes limit × CANDIDATES ranked candidates
+SOCK_PATH  = MEMORY_DIR / 'search.sock'
+CACHE_SIZE = 512   # results kept by --serve
+CACHE_TTL  = 300   # seconds; bounds staleness of cold (S3) results, which ingest doesn't version
+
+# A token mixing letters and digits, or containing _ - . / :, reads as an identifier
+IDENT_RE   = re.compile(r'[A-Za-z]+\d|\d+[A-Za-z]|\w[_\-./:]\w')
+
+def route(query: str):
+    """'trigram' for identifier-like queries, 'porter' for prose."""
+    terms = query.split()
+    if terms and all(len(t.strip('"')) >= 3 for t in terms) and any(IDENT_RE.search(t) for t in terms):
+        return 'trigram'
+    return 'porter'
+
+def trigram_query(query: str):
+    """Each whitespace-separated term becomes a quoted substring (implicit AND)."""
+    return ' '.join('"' + t.strip('"').replace('"', '""') + '"' for t in query.split())
 
-def search_hot(query: str, limit: int = 8):
+def doc_filter(since=None, until=None, source=None):
+    """
+    SQL predicate (on documents aliased `d`) and params for the date/source
+    filters. `source` is a glob; without wildcards it matches as a prefix.
+    Both forms can use the documents indexes.
+    """
+    clauses, params = [], []
+    if since:
+        clauses.append("d.date >= ?")
+        params.append(since)
+    if until:
+        clauses.append("d.date <= ?")
+        params.append(until)
+    if source:
+        clauses.append("d.source GLOB ?")
+        params.append(source if any(c in source for c in '*?[') else source + '*')
+    return ''.join(f" AND {c}" for c in clauses), params
+
+def lexical_ranked(cur, query: str, n: int, filters=('', [])):
+    """
+    BM25-ranked (chunk id, snippet, bm25) triples (bm25: lower is better). Identifier-like queries use the
+    trigram index when hot.db has one; prose that finds nothing in the
+    porter index gets a second chance as a substring search.
+    """
+    has_tri = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_tri'"
+    ).fetchone() is not None
+    plans = [('chunks_fts', query)]
+    if has_tri and all(len(t.strip('"')) >= 3 for t in query.split()):
+        tri = ('chunks_tri', trigram_query(query))
+        plans = [tri] if route(query) == 'trigram' else plans + [tri]
+    where, params = filters
+    for table, match in plans:
+        try:
+            rows = cur.execute(f"""
+                SELECT {table}.rowid, snippet({table}, 0, '>>>', '<<<', ' … ', 40), rank
+                FROM {table}
+                JOIN chunks c    ON c.id = {table}.rowid
+                JOIN documents d ON d.id = c.doc_id
+                WHERE {table} MATCH ?{where}
+                ORDER BY rank
+                LIMIT ?
+            """, (match, *params, n)).fetchall()
+        except sqlite3.Error as e:
+            print(f"[search] Hot query error ({table}): {e}", file=sys.stderr)
+            rows = []
+        if rows:
+            return rows
+    return []
+
+def vector_ranked(cur, query: str, n: int, filters=('', [])):
+    """(chunk id, cosine similarity) pairs, most similar first."""
+    where, params = filters
+    if where:
+        rows = cur.execute(f"""
+            SELECT e.chunk_id, e.vec FROM embeddings e
+            JOIN chunks c    ON c.id = e.chunk_id
+            JOIN documents d ON d.id = c.doc_id
+            WHERE e.model = ?{where}
+        """, (vectors.MODEL_NAME, *params)).fetchall()
+        ids, matrix = [r[0] for r in rows], vectors.from_blobs([r[1] for r in rows])
+    else:
+        ids, matrix = all_vectors(cur)
+    if not ids:
+        return []
+    idx, scores = vectors.top_k(matrix, vectors.encode([query])[0], n)
+    return [(ids[i], float(score)) for i, score in zip(idx, scores)]
+
+_vectors = {'generation': None, 'ids': [], 'matrix': None}
+
+def all_vectors(cur):
+    """
+    Every chunk vector as (ids, matrix). Stacking the BLOBs costs far more
+    than the scan, so the result is memoised per ingest generation — a
+    one-shot CLI call pays once, a --serve process almost never.
+    """
+    gen = generation(cur)
+    if _vectors['generation'] != gen or _vectors['matrix'] is None:
+        rows = cur.execute(
+            "SELECT chunk_id, vec FROM embeddings WHERE model = ?", (vectors.MODEL_NAME,)
+        ).fetchall()
+        _vectors.update(generation=gen, ids=[r[0] for r in rows],
+                        matrix=vectors.from_blobs([r[1] for r in rows]))
+    return _vectors['ids'], _vectors['matrix']
+
+def rrf(*rankings, k=RRF_K):
+    """Reciprocal rank fusion: score(d) = Σ 1 / (k + rank_i(d)) → [(d, score)], best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, rowid in enumerate(ranking, 1):
+            scores[rowid] = scores.get(rowid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+def open_hot():
+    """Read-only connection to hot.db, or None if it hasn't been built yet."""
     if not DB_PATH.exists():
+        return None
+    # Read-only: hot.db is in WAL mode, so this never blocks (or is blocked by) ingest
+    return sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+
+def generation(cur):
+    """ingest.py's change counter; any new value means cached results are stale."""
+    try:
+        row = cur.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+def search_hot(query: str, limit: int = 8, mode: str = 'hybrid',
+               since=None, until=None, source=None, conn=None):
+    """
+    Returns rows of (date, source, title, excerpt, byte_start, byte_end,
+    line_start, line_end, scores), where scores holds the fused 'rrf' score
+    plus whichever of 'bm25'/'cosine' produced the hit. `mode` is 'lexical',
+    'vector' or 'hybrid'; vector modes quietly degrade to lexical when
+    embeddings or their deps are missing.
+    since/until are inclusive YYYY-MM-DD bounds; source is a path glob/prefix.
+    Pass `conn` to reuse an open connection (it is left open).
+    """
+    own  = conn is None
+    conn = open_hot() if own else conn
+    if conn is None:
         return []
-    conn = sqlite3.connect(DB_PATH)
     cur  = conn.cursor()
-    try:
-        cur.execute("""
-            SELECT date, source, title,
-                   snippet(memory, 4, '>>>', '<<<', ' … ', 40) as excerpt
-            FROM memory
-            WHERE content MATCH ?
-            ORDER BY rank
-            LIMIT ?
-        """, (query, limit))
-        rows = cur.fetchall()
-    except Exception as e:
-        rows = []
-        print(f"[search] Hot query error: {e}", file=sys.stderr)
-    conn.close()
+    n    = limit * CANDIDATES
+    if not cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone():
+        print("[search] hot.db uses an older layout. Run: python3 memory/bin/ingest.py", file=sys.stderr)
+        if own:
+            conn.close()
+        return []
+    filters = doc_filter(since, until, source)
+
+    semantic = []
+    if mode != 'lexical' and vectors.available():
+        semantic = vector_ranked(cur, query, n, filters)
+    # Vector mode with nothing to rank by similarity (no deps, no embeddings yet) falls back to lexical
+    lexical  = lexical_ranked(cur, query, n, filters) if mode != 'vector' or not semantic else []
+    snippets = {r: snip for r, snip, _ in lexical}
+    bm25     = {r: score for r, _, score in lexical}
+    cosine   = dict(semantic)
+    fused  = rrf([r for r, *_ in lexical], [r for r, _ in semantic])[:limit]
+    ranked = [r for r, _ in fused]
+
+    rows = []
+    if ranked:
+        found = {r[0]: r[1:] for r in cur.execute(f"""
+            SELECT c.id, d.date, d.source, d.title, c.content,
+                   c.byte_start, c.byte_end, c.line_start, c.line_end
+            FROM chunks c JOIN documents d ON d.id = c.doc_id
+            WHERE c.id IN ({','.join('?' * len(ranked))})
+        """, ranked)}
+        for chunk_id, score in fused:
+            date_, src, title, content, *offsets = found[chunk_id]
+            excerpt = snippets.get(chunk_id) or (content[:240] + (' …' if len(content) > 240 else ''))
+            scores  = {'rrf': score}
+            if chunk_id in bm25:
+                scores['bm25'] = bm25[chunk_id]
+            if chunk_id in cosine:
+                scores['cosine'] = cosine[chunk_id]
+            rows.append((date_, src, title, excerpt, *offsets, scores))
+    if own:
+        conn.close()
     return rows
 
-def search_cold(query: str, limit: int = 5):
-    """Download S3 index and grep for query terms in archived filenames + summaries."""
+def read_region(source: str, byte_start: int, byte_end: int):
+    """
+    Read just one chunk's byte range from its source file (seek, no full
+    read), or None for a day promoted from the cold tier, which has no file.
+    """
+    path = WORKSPACE / source
     try:
-        import subprocess, json as _json
-        # Pull the cold index file
-        result = subprocess.run(
-            ['aws', 's3', 'cp', f's3://{S3_BUCKET}/index.json', '-'],
-            capture_output=True, text=True
-        )
-        if result.returncode != 0:
-            return []
-
-        index = _json.loads(result.stdout)
-        terms = [t.lower() for t in query.split()]
-        hits  = []
-        for entry in index:
-            text = (entry.get('title','') + ' ' + entry.get('summary','')).lower()
-            if any(t in text for t in terms):
-                hits.append(entry)
-                if len(hits) >= limit:
-                    break
-        return hits
-    except Exception as e:
-        print(f"[search] Cold search error: {e}", file=sys.stderr)
+        with path.open('rb') as f:
+            f.seek(byte_start)
+            return f.read(byte_end - byte_start).decode('utf-8', errors='replace')
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        return f"(unavailable: {e})"
+
+def cold_match(query: str):
+    """FTS5 query for the cold index: any term may match (OR), ranked by BM25."""
+    return ' OR '.join('"' + t.replace('"', '""') + '"' for t in query.split())
+
+def search_cold(query: str, limit: int = 5, since=None, until=None):
+    """
+    BM25-ranked archived days whose title or summary match the query.
+    Errors propagate: the caller reports them only if it uses the hits.
+    """
+    conn = coldstore.index_db(since=since, until=until)
+    if conn is None or not query.split():
         return []
+    where, params = '', []
+    if since:
+        where += " AND e.date >= ?"
+        params.append(since)
+    if until:
+        where += " AND e.date <= ?"
+        params.append(until)
+    rows = conn.execute(f"""
+        SELECT e.date, e.title, e.summary, e.key, e.member, bm25(entries_fts, 2.0, 1.0)
+        FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid
+        WHERE entries_fts MATCH ?{where}
+        ORDER BY bm25(entries_fts, 2.0, 1.0)
+        LIMIT ?
+    """, (cold_match(query), *params, limit)).fetchall()
+    return [{'date': d, 'title': t, 'summary': s, 'key': k, 'member': m, 'bm25': score}
+            for d, t, s, k, m, score in rows]
+
+def search_deep(query: str, limit: int = 5, since=None, until=None):
+    """
+    BM25-ranked archived days whose full text matches, read through the
+    archive cache. Errors propagate, as in search_cold.
+    """
+    index = coldstore.index_db(since=since, until=until)
+    if index is None or not query.split():
+        return []
+    where, params = '', []
+    if since:
+        where += " AND date >= ?"
+        params.append(since)
+    if until:
+        where += " AND date <= ?"
+        params.append(until)
+    cols    = ('date', 'title', 'key', 'member', 'offset', 'length', 'codec', 'zdict')
+    entries = [dict(zip(cols, row)) for row in index.execute(f"""
+        SELECT {', '.join(cols)} FROM entries WHERE 1 = 1{where}
+        ORDER BY date DESC LIMIT ?
+    """, (*params, DEEP_CANDIDATES))]
+    texts = coldstore.read_archives(entries)
+
+    mem = sqlite3.connect(':memory:')
+    mem.execute("CREATE VIRTUAL TABLE body USING fts5(text, tokenize='porter unicode61')")
+    mem.executemany("INSERT INTO body (rowid, text) VALUES (?, ?)",
+                    ((i, texts[(e['key'], e['member'])]) for i, e in enumerate(entries)
+                     if (e['key'], e['member']) in texts))
+    rows = mem.execute("""
+        SELECT rowid, snippet(body, 0, '>>>', '<<<', ' … ', 20), bm25(body)
+        FROM body WHERE body MATCH ? ORDER BY rank LIMIT ?
+    """, (cold_match(query), limit)).fetchall()
+    mem.close()
+    return [{'date': entries[i]['date'], 'title': entries[i]['title'], 'key': entries[i]['key'],
+             'member': entries[i]['member'], 'summary': snippet, 'bm25': score}
+            for i, snippet, score in rows]
+
+class Background:
+    """
+    Run fn(*args) on a daemon thread, so an abandoned call never holds up
+    exit. An exception is kept in .error for the caller to report or ignore.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        self.result, self.error, self.ms, self.done = None, None, None, threading.Event()
+        t0 = time.perf_counter()
+        def run():
+            try:
+                self.result = fn(*args, **kwargs)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.ms = round((time.perf_counter() - t0) * 1000, 2)
+                self.done.set()
+        threading.Thread(target=run, daemon=True).start()
+
+def dedup_cold(hot, cold):
+    """Drop cold hits for days the hot tier already returned (same file name)."""
+    seen = {Path(r[1]).name for r in hot}
+    return [h for h in cold if coldstore.archived_name(h) not in seen]
+
+_promotions = []   # promote_later threads a one-shot search or --batch waits for before returning
+
+def promote_due(hits):
+    """Count cold hits; days that keep coming up are promoted into hot.db in the background."""
+    try:
+        due = tiers.count_hits(hits)
+    except sqlite3.Error as e:
+        print(f"[search] Could not record cold hits: {e}", file=sys.stderr)
+        return
+    if due:
+        _promotions[:] = [t for t in _promotions if t.is_alive()]   # the server never joins them
+        _promotions.append(tiers.promote_later(due))
+
+def finish_promotions():
+    """
+    Wait for promotions started by this process. main() must not return
+    first: once it does, concurrent.futures refuses new work, and promote()
+    reads archives through a thread pool.
+    """
+    while _promotions:
+        _promotions.pop().join()
+
+def run_query(req: dict, conn=None):
+    """
+    Answer one request — {'query', 'limit', 'mode', 'since', 'until',
+    'source', 'cold', 'deep', 'deadline'} — with {'hot': rows, 'cold': hits,
+    'partial': bool, 'timings': {'hot_ms', 'cold_ms'}}. Cold search starts
+    alongside the hot tier; its hits are used when forced or when the hot
+    tier is sparse, if they arrive within the deadline (DEADLINE, or
+    DEEP_DEADLINE for 'deep', unless given). 'deep' searches archived
+    bodies instead of summaries and implies 'cold'.
+    """
+    t0   = time.perf_counter()
+    deep = req.get('deep')
+    cold = Background(search_deep if deep else search_cold,
+                      req['query'], since=req.get('since'), until=req.get('until'))
+    hot  = search_hot(req['query'], req.get('limit', 8), req.get('mode', 'hybrid'),
+                      since=req.get('since'), until=req.get('until'),
+                      source=req.get('source'), conn=conn)
+    hot_ms = round((time.perf_counter() - t0) * 1000, 2)
+
+    hits, partial = [], False
+    if req.get('cold') or deep or len(hot) < HOT_THRESH:
+        deadline = req.get('deadline')
+        if deadline is None:
+            deadline = DEEP_DEADLINE if deep else DEADLINE
+        remaining = deadline - (time.perf_counter() - t0)
+        if not cold.done.wait(max(remaining, 0)):
+            partial = True
+        elif cold.error:
+            print(f"[search] {'Deep' if deep else 'Cold'} search error: {cold.error}", file=sys.stderr)
+        else:
+            hits = dedup_cold(hot, cold.result)
+            promote_due(hits)
+    return {'hot': [list(r) for r in hot], 'cold': hits, 'partial': partial,
+            'timings': {'hot_ms': hot_ms, 'cold_ms': cold.ms}}
+
+def tier_of(result: dict):
+    """Which tier(s) answered: 'hot', 'cold', 'hot+cold' or 'none'."""
+    return '+'.join(t for t in ('hot', 'cold') if result[t]) or 'none'
+
+def hot_record(row):
+    date_, source, title, excerpt, b0, b1, l0, l1, scores = row
+    return {'date': date_, 'source': source, 'title': title, 'excerpt': excerpt,
+            'lines': [l0, l1], 'bytes': [b0, b1], **scores}
+
+def batch(defaults: dict, lines):
+    """
+    --batch: one query per input line — plain text, or a JSON object with
+    'query' and any of the request fields (plus an 'id' that is echoed
+    back) — answered over a single connection, one JSON object per line.
+    Repeating the same SQL on one connection reuses sqlite3's cached
+    prepared statements, so per-query cost is the search itself.
+    """
+    conn = open_hot()
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            req = dict(defaults)
+            try:
+                if line.startswith('{'):
+                    req.update(json.loads(line))
+                else:
+                    req['query'] = line
+                t0     = time.perf_counter()
+                result = run_query(req, conn)
+                out    = {'query': req['query'], 'tier': tier_of(result),
+                          'ms': round((time.perf_counter() - t0) * 1000, 2),
+                          'partial': result['partial'], 'timings': result['timings'],
+                          'hot': [hot_record(r) for r in result['hot']], 'cold': result['cold']}
+            except Exception as e:
+                out = {'query': req.get('query') or line, 'error': str(e)}
+            if 'id' in req:
+                out = {'id': req['id'], **out}
+            print(json.dumps(out, ensure_ascii=False), flush=True)
+    finally:
+        if conn:
+            conn.close()
+        finish_promotions()
+
+# ── Server mode ────────────────────────────────────────────────────────────
+
+class WarmState:
+    """The server's long-lived connection plus its generation-keyed LRU cache."""
+
+    def __init__(self):
+        self.conn, self.inode = None, None
+        self.cache = OrderedDict()   # json key -> (generation, stored_at, result)
+        self.stats = {'requests': 0, 'hits': 0, 'misses': 0}
+
+    def connection(self):
+        # hot.db deleted and recreated (or restored from a backup): reopen when the inode changes
+        try:
+            inode = DB_PATH.stat().st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self.inode:
+            if self.conn:
+                self.conn.close()
+            self.conn, self.inode = open_hot(), inode
+        return self.conn
+
+    def answer(self, req: dict):
+        if req.get('op') == 'stats':
+            return dict(self.stats, cached=len(self.cache))
+        self.stats['requests'] += 1
+        conn = self.connection()
+        gen  = generation(conn.cursor()) if conn else 0
+        key  = json.dumps(req, sort_keys=True)
+        hit  = self.cache.get(key)
+        if hit and hit[0] == gen and time.monotonic() - hit[1] < CACHE_TTL:
+            self.cache.move_to_end(key)
+            self.stats['hits'] += 1
+            return dict(hit[2], cached=True, generation=gen)
+        self.stats['misses'] += 1
+        result = run_query(req, conn)
+        if not result['partial']:   # a retry may well get the cold half
+            self.cache[key] = (gen, time.monotonic(), result)
+            self.cache.move_to_end(key)
+            while len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return dict(result, cached=False, generation=gen)
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """One newline-terminated JSON request in, one JSON line out."""
+
+    def handle(self):
+        try:
+            req  = json.loads(self.rfile.readline())
+            resp = self.server.state.answer(req)
+        except Exception as e:
+            resp = {'error': str(e)}
+        self.wfile.write(json.dumps(resp).encode() + b'\n')
+
+def serve():
+    """Run the warm search server until interrupted (requests are handled serially)."""
+    if SOCK_PATH.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(SOCK_PATH))
+            sys.exit(f"[search] A server is already listening on {SOCK_PATH}")
+        except OSError:
+            SOCK_PATH.unlink()   # stale socket from a server that died
+        finally:
+            probe.close()
+
+    server = socketserver.UnixStreamServer(str(SOCK_PATH), RequestHandler)
+    server.state = WarmState()
+    if vectors.available():
+        vectors.model()   # load once, up front
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"[search] Serving on {SOCK_PATH}; Ctrl-C to stop", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        SOCK_PATH.unlink(missing_ok=True)
+
+def query_server(req: dict, timeout: float = 60.0):
+    """Ask a running --serve process; None if there isn't one (or it failed)."""
+    if not SOCK_PATH.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(str(SOCK_PATH))
+        sock.sendall(json.dumps(req).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            resp = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+    if 'error' in resp:
+        print(f"[search] Server error: {resp['error']}", file=sys.stderr)
+        return None
+    return resp
 
-def print_results(hot_rows, cold_hits, query):
+def print_results(hot_rows, cold_hits, query, region=False, partial=False, timings=None):
     print(f"\n{'='*60}")
     print(f"  Memory search: \"{query}\"")
     print(f"{'='*60}\n")
 
     if hot_rows:
         print(f"── HOT (local, {len(hot_rows)} result{'s' if len(hot_rows)!=1 else ''}) ─────────────────────\n")
-        for date_, source, title, excerpt in hot_rows:
+        for date_, source, title, excerpt, b0, b1, l0, l1, _ in hot_rows:
             print(f"  [{date_}] {title}")
-            print(f"  Source: {source}")
-            print(f"  {excerpt.strip()}")
+            print(f"  Source: {source}:{l0}" + (f"-{l1}" if l1 != l0 else ""))
+            if region:
+                text = read_region(source, b0, b1)
+                for line in (excerpt if text is None else text).strip().splitlines():
+                    print(f"  │ {line}")
+            else:
+                print(f"  {excerpt.strip()}")
             print()
     else:
         print("  No hot results. Run: python3 memory/bin/ingest.py\n")
@@ -85,28 +584,66 @@ def print_results(hot_rows, cold_hits, query):
         print(f"── COLD (S3, {len(cold_hits)} result{'s' if len(cold_hits)!=1 else ''}) ─────────────────────\n")
         for h in cold_hits:
             print(f"  [{h.get('date','?')}] {h.get('title','?')}")
-            print(f"  S3 key: {h.get('key','?')}")
+            print(f"  S3 key: {h.get('key','?')}" + (f" → {h['member']}" if h.get('member') else ""))
             print(f"  {h.get('summary','')[:200]}")
             print()
 
-    if not hot_rows and not cold_hits:
+    if partial:
+        print("  Cold search missed the deadline; results are hot-tier only (partial).\n")
+    elif not hot_rows and not cold_hits:
         print("  No results found in hot or cold storage.\n")
 
+    if timings:
+        cold_ms = timings.get('cold_ms')
+        print(f"  hot {timings['hot_ms']:.0f} ms · cold "
+              + (f"{cold_ms:.0f} ms" if cold_ms is not None else "still running"))
     print(f"{'='*60}\n")
 
 def main():
     parser = argparse.ArgumentParser(description='Search Pax memory storage')
-    parser.add_argument('query', help='Search query')
+    parser.add_argument('query', nargs='?', help='Search query')
     parser.add_argument('--limit', type=int, default=8, help='Max results (default 8)')
     parser.add_argument('--cold', action='store_true', help='Always include S3 cold search')
+    parser.add_argument('--deep', action='store_true',
+                        help=f'Cold search over the full text of the {DEEP_CANDIDATES} newest archived days in range')
+    parser.add_argument('--mode', choices=['hybrid', 'lexical', 'vector'], default='hybrid',
+                        help='Hot-tier retrieval: BM25, embeddings, or both fused (default hybrid)')
+    parser.add_argument('--since', metavar='YYYY-MM-DD', help='Only memories dated on/after this day')
+    parser.add_argument('--until', metavar='YYYY-MM-DD', help='Only memories dated on/before this day')
+    parser.add_argument('--source', metavar='GLOB',
+                        help='Only hot-tier files whose path matches (prefix if no wildcard), e.g. memory/2026-02')
+    parser.add_argument('--region', action='store_true',
+                        help='Print the full matching chunk from the source file instead of a snippet')
+    parser.add_argument('--serve', action='store_true',
+                        help=f'Run a warm search server on {SOCK_PATH.name} instead of searching')
+    parser.add_argument('--no-server', action='store_true',
+                        help='Search in-process even if a server is running')
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                        help=f'How long a sparse query waits for cold results '
+                             f'(default {DEADLINE}, or {DEEP_DEADLINE} with --deep)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Read queries (text or JSON) from stdin, write JSONL results to stdout')
     args = parser.parse_args()
 
-    hot  = search_hot(args.query, args.limit)
-    cold = []
-    if args.cold or len(hot) < HOT_THRESH:
-        cold = search_cold(args.query)
+    req = {'query': args.query, 'limit': args.limit, 'mode': args.mode,
+           'cold': args.cold, 'deep': args.deep,
+           'since': args.since, 'until': args.until, 'source': args.source,
+           'deadline': args.deadline}
+    if args.serve:
+        serve()
+        return
+    if args.batch:
+        batch(req, sys.stdin)
+        return
+    if not args.query:
+        parser.error('a query is required (or --serve / --batch)')
 
-    print_results(hot, cold, args.query)
+    result = None if args.no_server else query_server(req)
+    if result is None:
+        result = run_query(req)
+    print_results(result['hot'], result['cold'], args.query, region=args.region,
+                  partial=result.get('partial', False), timings=result.get('timings'))
+    finish_promotions()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Tier lifecycle: moving memory files between the hot and the cold tier.
+
+A memory file is hot while it is younger than archive.py's HOT_DAYS: on
+disk in memory/ and indexed in hot.db. Once archive.py has packed it into
+a bundle, evict() takes it out of hot.db and deletes the file, but only
+for files verify() has just read back from the store itself (not from a
+local cache) and found byte-identical. compact() then folds the FTS5
+indexes and VACUUMs hot.db, so the file shrinks instead of growing a free
+list.
+
+promote() brings archived days back into hot.db, re-chunked from their
+archives, so they get chunk-level BM25 and vector search again. Promoted
+days have no file on disk: their documents rows carry promoted_at, which
+ingest.py leaves alone. search.py counts the archived days it returns as
+cold hits (cold-cache/hits.db) and promotes a day once it has come up
+PROMOTE_AFTER times.
+
+Promoted days leave hot.db again PROMOTE_DAYS after their last promotion,
+and no more than PROMOTE_MAX are kept (oldest go first), so hot.db holds at
+most HOT_DAYS of files plus PROMOTE_MAX days however long the history is.
+
+Usage:
+  python3 memory/bin/tiers.py promote 2025-03-14 2025-04   # days, or whole months
+  python3 memory/bin/tiers.py status
+"""
+import sys, gzip, hashlib, argparse, sqlite3, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import bundle
+import coldstore
+import ingest
+
+PROMOTE_AFTER = 3    # cold hits on one day before search.py promotes it
+PROMOTE_DAYS  = 30   # promoted days are evicted again this long after promotion
+PROMOTE_MAX   = 60   # ...and at most this many are kept
+HITS_DB       = coldstore.CACHE_DIR / 'hits.db'
+JOBS          = 8    # concurrent bundle reads while verifying
+
+_promote_lock = threading.Lock()   # one promotion at a time per process (the server is threaded)
+
+def now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def sha256(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+def open_hot():
+    """Writable connection to hot.db, or None before the first ingest."""
+    if not ingest.DB_PATH.exists():
+        return None
+    conn = sqlite3.connect(ingest.DB_PATH, timeout=30)
+    if not ingest.has_table(conn, 'documents'):
+        conn.close()
+        return None
+    conn.execute("PRAGMA synchronous=NORMAL")
+    ingest.migrate_columns(conn)
+    conn.commit()
+    return conn
+
+def chunker(conn):
+    """(size, overlap) hot.db was chunked with, so promoted days are cut the same way."""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'chunker'").fetchone()
+    try:
+        _, size, overlap = row[0].split(':')
+        return int(size), int(overlap)
+    except (TypeError, ValueError):
+        return ingest.CHUNK_SIZE, ingest.CHUNK_OVERLAP
+
+def drop_document(cursor, source: str):
+    """Remove a document outright (no tombstone); triggers clear its FTS postings and vectors."""
+    cursor.execute(
+        "DELETE FROM chunks WHERE doc_id IN (SELECT id FROM documents WHERE source = ?)", (source,)
+    )
+    cursor.execute("DELETE FROM documents WHERE source = ?", (source,))
+
+# ── Eviction ───────────────────────────────────────────────────────────────
+
+def read_back(store, key: str):
+    """{file name: raw bytes} for every day in one archive object, fetched from the store."""
+    if key.endswith(bundle.SUFFIX):
+        return {row['name']: raw for row, raw in bundle.read_bundle(store, key, verify=True)}
+    data, _ = store.get(key)
+    return {coldstore.archived_name({'key': key}): gzip.decompress(data) if key.endswith('.gz') else data}
+
+def verify(store, entries, jobs=JOBS):
+    """
+    Compare the archived copy of each index entry with its file in memory/
+    → the paths that are safe to evict. Each archive object is read once;
+    anything unreadable or different is reported and stays hot.
+    """
+    groups = {}
+    for e in entries:
+        groups.setdefault(e['key'], []).append(e)
+
+    def check(key):
+        try:
+            got = read_back(store, key)
+        except Exception as exc:
+            print(f"[tiers] Can't read back {key}, keeping its files: {exc}", file=sys.stderr)
+            return []
+        ok = []
+        for e in groups[key]:
+            name = coldstore.archived_name(e)
+            path = ingest.MEMORY_DIR / name
+            try:
+                want = sha256(path.read_bytes())
+            except FileNotFoundError:
+                continue
+            raw = got.get(name)
+            if raw is not None and sha256(raw) == want and e.get('sha256', want) == want:
+                ok.append(path)
+            else:
+                print(f"[tiers] {name} doesn't match {key}; keeping it hot", file=sys.stderr)
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return sorted({path for ok in pool.map(check, groups) for path in ok})
+
+def evict(conn, paths):
+    """Take verified files out of hot.db, then off disk → the number evicted."""
+    if conn is not None:
+        cur = conn.cursor()
+        for path in paths:
+            drop_document(cur, ingest.source_of(path))
+        if paths:
+            ingest.bump_generation(cur)
+        conn.commit()
+    # Only once hot.db has let go: a crash in between leaves a file the next run evicts again
+    for path in paths:
+        path.unlink(missing_ok=True)
+    return len(paths)
+
+def expire(conn, days=PROMOTE_DAYS, keep=PROMOTE_MAX):
+    """Drop promoted days older than `days` and the oldest beyond `keep` → the number dropped."""
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat(timespec='seconds')
+    cur    = conn.cursor()
+    stale  = {source for (source,) in cur.execute("""
+        SELECT source FROM documents WHERE promoted_at IS NOT NULL
+        ORDER BY promoted_at DESC LIMIT -1 OFFSET ?
+    """, (keep,))}
+    stale |= {source for (source,) in cur.execute(
+        "SELECT source FROM documents WHERE promoted_at < ?", (cutoff,)
+    )}
+    for source in stale:
+        drop_document(cur, source)
+    if stale:
+        ingest.bump_generation(cur)
+    conn.commit()
+    return len(stale)
+
+def file_kib(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return conn.execute("PRAGMA page_count").fetchone()[0] * page_size / 1024
+
+def compact(conn):
+    """
+    Merge the FTS5 indexes down to one segment (purging evicted postings),
+    VACUUM and truncate the WAL → (KiB before, KiB after).
+    """
+    before = file_kib(conn)
+    ingest.merge_segments(conn, optimize=True)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except sqlite3.OperationalError as e:
+        # A long-running reader can hold it off; freed pages are still reused by later writes
+        print(f"[tiers] VACUUM skipped: {e}", file=sys.stderr)
+    return before, file_kib(conn)
+
+# ── Promotion ──────────────────────────────────────────────────────────────
+
+def lookup(store, since=None, until=None, names=None):
+    """Index entries in [since, until], optionally only for these file names; one per name."""
+    found = {}
+    for e in coldstore.fetch_index(store, since=since, until=until):
+        name = coldstore.archived_name(e)
+        if (since is None or e['date'] >= since) and (until is None or e['date'] <= until) \
+                and (names is None or name in names):
+            found[name] = e   # a later entry (a re-archived day) wins
+    return [found[n] for n in sorted(found)]
+
+def promote(entries, store=None, embed=False):
+    """
+    Re-hydrate archived days (index entries) into hot.db → the number
+    promoted. Days whose file is back in memory/ are already hot and are
+    skipped; promoting an already promoted day renews it.
+    """
+    store = store or coldstore.open_store()
+    with _promote_lock:
+        conn = open_hot()
+        if conn is None:
+            print("[tiers] No hot.db yet. Run: python3 memory/bin/ingest.py", file=sys.stderr)
+            return 0
+        try:
+            texts         = coldstore.read_archives(entries, store)
+            size, overlap = chunker(conn)
+            cur, stamp    = conn.cursor(), now()
+            promoted      = []
+            for e in entries:
+                text = texts.get((e['key'], e.get('member')))
+                path = ingest.MEMORY_DIR / coldstore.archived_name(e)
+                if text is None or path.exists():
+                    continue
+                doc = ingest.parse_bytes(path, text.encode('utf-8'), e['date'], size, overlap)
+                ingest.write_parsed(cur, doc, ingest.doc_row(cur, doc['source']))
+                cur.execute("UPDATE documents SET promoted_at = ? WHERE source = ?", (stamp, doc['source']))
+                promoted.append(path.name)
+            if promoted:
+                ingest.bump_generation(cur)
+            conn.commit()
+            forget_hits(promoted)
+            expire(conn)
+            if embed:
+                ingest.embed_missing(conn)
+            return len(promoted)
+        finally:
+            conn.close()
+
+def _hits_db():
+    HITS_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(HITS_DB, timeout=5)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS hits (
+            name    TEXT PRIMARY KEY,   -- archived file name
+            date    TEXT NOT NULL,
+            count   INTEGER NOT NULL,
+            last_at TEXT NOT NULL
+        )
+    """)
+    return conn
+
+def count_hits(hits):
+    """
+    Record one answer's cold hits (search.py result dicts) → those that have
+    now come up PROMOTE_AFTER times and are due for promotion.
+    """
+    if not hits:
+        return []
+    names = {coldstore.archived_name(h): h['date'] for h in hits}
+    conn  = _hits_db()
+    try:
+        with conn:
+            stamp = now()
+            conn.executemany("""
+                INSERT INTO hits (name, date, count, last_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT(name) DO UPDATE SET count = count + 1, last_at = excluded.last_at
+            """, [(name, date_, stamp) for name, date_ in names.items()])
+            due = {name for (name,) in conn.execute(
+                f"SELECT name FROM hits WHERE count >= ? AND name IN ({','.join('?' * len(names))})",
+                (PROMOTE_AFTER, *names))}
+    finally:
+        conn.close()
+    return [h for h in hits if coldstore.archived_name(h) in due]
+
+def forget_hits(names):
+    """Reset the hit counts of promoted days, so expiry is followed by a fresh count."""
+    if not names:
+        return
+    conn = _hits_db()
+    try:
+        with conn:
+            conn.executemany("DELETE FROM hits WHERE name = ?", [(n,) for n in names])
+    finally:
+        conn.close()
+
+def promote_hits(hits, store=None):
+    """Promote search.py's due cold hits → the number promoted; errors are reported, not raised."""
+    try:
+        dates   = sorted(h['date'] for h in hits)
+        entries = lookup(store or coldstore.open_store(), dates[0], dates[-1],
+                         names={coldstore.archived_name(h) for h in hits})
+        n = promote(entries, store)
+    except Exception as e:
+        print(f"[tiers] Promotion failed: {e}", file=sys.stderr)
+        return 0
+    if n:
+        print(f"[tiers] Promoted {n} often-searched archived day(s) into hot.db", file=sys.stderr)
+    return n
+
+def promote_later(hits):
+    """
+    promote_hits() on a background thread → the thread. A one-shot caller
+    prints its answer first and must join() the thread before main()
+    returns: after that, concurrent.futures (used by read_archives)
+    refuses new work.
+    """
+    thread = threading.Thread(target=promote_hits, args=(hits,))
+    thread.start()
+    return thread
+
+# ── CLI ────────────────────────────────────────────────────────────────────
+
+def day_range(spec: str):
+    """'YYYY-MM-DD' or 'YYYY-MM' → inclusive (since, until)."""
+    try:
+        if len(spec) == 7:
+            datetime.strptime(spec, '%Y-%m')
+            return f"{spec}-01", f"{spec}-31"
+        datetime.strptime(spec, '%Y-%m-%d')
+        return spec, spec
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD or YYYY-MM, got {spec!r}")
+
+def status(store):
+    conn = open_hot()
+    if conn is None:
+        print("[tiers] No hot.db yet.")
+        return
+    try:
+        files, promoted = conn.execute("""
+            SELECT count(*) FILTER (WHERE promoted_at IS NULL), count(promoted_at)
+            FROM documents WHERE deleted_at IS NULL
+        """).fetchone()
+        oldest = conn.execute(
+            "SELECT min(promoted_at) FROM documents WHERE promoted_at IS NOT NULL"
+        ).fetchone()[0]
+        print(f"[tiers] hot.db: {file_kib(conn):.0f} KiB, {files} file(s) + {promoted}/{PROMOTE_MAX} "
+              f"promoted day(s)" + (f" (oldest promoted {oldest})" if oldest else ''))
+    finally:
+        conn.close()
+    hits = _hits_db()
+    try:
+        top = hits.execute("SELECT name, count FROM hits ORDER BY count DESC, last_at DESC LIMIT 10").fetchall()
+    finally:
+        hits.close()
+    if top:
+        print(f"[tiers] Cold hits (promoted at {PROMOTE_AFTER}): "
+              + ', '.join(f"{name} ×{count}" for name, count in top))
+
+def main():
+    parser = argparse.ArgumentParser(description='Promote archived days into hot.db; show tier status')
+    parser.add_argument('command', choices=['promote', 'status'])
+    parser.add_argument('days', nargs='*', type=day_range, metavar='YYYY-MM[-DD]',
+                        help='promote: archived days or whole months')
+    parser.add_argument('--store', metavar='URL', help='Cold store (default: MEMORY_COLD_STORE or S3)')
+    parser.add_argument('--embed', action=argparse.BooleanOptionalAction, default=None,
+                        help='Embed promoted chunks now rather than at the next ingest '
+                             '(default: on if the vector deps are installed)')
+    args  = parser.parse_args()
+    store = coldstore.open_store(args.store)
+
+    if args.command == 'status':
+        status(store)
+        return
+    if not args.days:
+        parser.error('promote needs at least one day or month')
+    entries = {}
+    for since, until in args.days:
+        for e in lookup(store, since, until):
+            entries[coldstore.archived_name(e)] = e
+    if not entries:
+        sys.exit("[tiers] No archived days in that range")
+    n = promote(list(entries.values()), store, embed=ingest.want_embeddings(args.embed))
+    print(f"[tiers] Promoted {n} of {len(entries)} archived day(s) into hot.db "
+          f"(they expire after {PROMOTE_DAYS} days)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Sentence embeddings for the memory hot store, shared by ingest.py and search.py.
+
+Uses the same open-source model as scripts/definitions.py
+(all-MiniLM-L6-v2, 384 dimensions). Vectors are L2-normalised and stored as
+little-endian float32 BLOBs, so cosine similarity is a plain dot product and
+a whole table scan is one matrix-vector multiply.
+
+Both numpy and sentence-transformers are optional: available() reports
+whether vector search can run, and callers fall back to BM25 when it can't.
+
+Requirements (optional):
+  pip install numpy sentence-transformers
+"""
+import sys
+
+MODEL_NAME  = 'sentence-transformers/all-MiniLM-L6-v2'  # 384 dimensions
+DIM         = 384
+BATCH_SIZE  = 64
+
+_model = None
+
+def available():
+    """True when both numpy and sentence-transformers can be imported."""
+    try:
+        import numpy                  # noqa: F401
+        import sentence_transformers  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def model():
+    """Load the embedding model once per process (it takes a second or two)."""
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+        print(f"[vectors] Loading model: {MODEL_NAME}", file=sys.stderr)
+        _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+def encode(texts):
+    """Embed `texts` in batches → (n, DIM) float32 array of unit vectors."""
+    import numpy as np
+    vecs = model().encode(list(texts), batch_size=BATCH_SIZE,
+                          normalize_embeddings=True, show_progress_bar=False)
+    return np.ascontiguousarray(vecs, dtype='<f4')
+
+def to_blob(vec):
+    import numpy as np
+    return np.asarray(vec, dtype='<f4').tobytes()
+
+def from_blobs(blobs):
+    """Stack float32 BLOBs into one (n, DIM) matrix with a single copy."""
+    import numpy as np
+    if not blobs:
+        return np.zeros((0, DIM), dtype='<f4')
+    return np.frombuffer(b''.join(blobs), dtype='<f4').reshape(len(blobs), -1)
+
+def top_k(matrix, query_vec, k):
+    """
+    Indices and scores of the k rows of `matrix` most similar to `query_vec`.
+    One BLAS matvec plus an O(n) partial sort — ~10 ms for 100k × 384.
+    """
+    import numpy as np
+    if len(matrix) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype='<f4')
+    scores = matrix @ np.asarray(query_vec, dtype='<f4')
+    k      = min(k, len(scores))
+    idx    = np.argpartition(-scores, k - 1)[:k]
+    idx    = idx[np.argsort(-scores[idx])]
+    return idx, scores[idx]
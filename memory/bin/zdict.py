@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Zstandard dictionaries for archived memory files.
+
+Daily notes are small and repeat the same headings and boilerplate, which
+gzip can't exploit when each file is compressed on its own. A dictionary
+trained on the memory corpus primes zstd with that shared text, so even a
+one-screen note compresses well.
+
+Dictionaries are immutable and named by content hash: dicts/<id>.zdict in
+the cold store, next to index.json, with dicts/current.json naming the one
+new archives use. Bundles record the id they were packed with, so archives
+stay readable after retraining. Dictionaries are cached locally in
+memory/cold-cache/dicts/.
+
+Usage:
+  python3 memory/bin/zdict.py train [--size 112640] [--store URL]
+  python3 memory/bin/zdict.py bench            # gzip vs zstd vs zstd+dictionary on memory/*.md
+
+Requirements (optional; gzip is used without it):
+  pip install zstandard
+"""
+import sys, json, gzip, hashlib, argparse, random, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+
+WORKSPACE  = Path(__file__).resolve().parents[2]
+MEMORY_DIR = WORKSPACE / 'memory'
+CACHE_DIR  = MEMORY_DIR / 'cold-cache' / 'dicts'
+DICT_SIZE  = 112640   # zstd's default dictionary size (110 KiB)
+LEVEL      = 19       # archives are written once and read rarely
+CURRENT    = 'dicts/current.json'
+
+_local = threading.local()   # per-thread (de)compressors: zstd contexts aren't thread-safe
+
+def available():
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def dict_id(data: bytes):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def dict_key(did: str):
+    return f'dicts/{did}.zdict'
+
+def _context(kind: str, zdict, level=LEVEL):
+    """
+    A reusable compressor or decompressor for this thread. Loading a
+    dictionary costs far more than compressing a small note, so each
+    context is built once per (dictionary, level) and kept.
+    """
+    import zstandard
+    cache = _local.__dict__.setdefault('contexts', {})
+    key   = (kind, zdict, level)   # bytes cache their hash, so this stays cheap
+    if key not in cache:
+        zd = None
+        if zdict:
+            zd = zstandard.ZstdCompressionDict(zdict)
+            # Digest the dictionary once; otherwise every call re-derives its tables
+            zd.precompute_compress(level=level)
+        if kind == 'c':
+            cache[key] = zstandard.ZstdCompressor(level=level, dict_data=zd)
+        else:
+            cache[key] = zstandard.ZstdDecompressor(dict_data=zd)
+    return cache[key]
+
+def compress(raw: bytes, zdict=None, level=LEVEL):
+    """zstd-compress raw, primed with dictionary bytes `zdict` if given."""
+    return _context('c', zdict, level).compress(raw)
+
+def decompress(blob: bytes, zdict=None):
+    return _context('d', zdict).decompress(blob)
+
+def train(samples, size=DICT_SIZE):
+    """Dictionary bytes trained on `samples` (a list of bytes, ideally hundreds of files)."""
+    import zstandard
+    return zstandard.train_dictionary(size, list(samples)).as_bytes()
+
+def load(store, did: str):
+    """Dictionary bytes for `did`, from memory, the local cache, or the store."""
+    path = CACHE_DIR / f'{did}.zdict'
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        pass
+    data, _ = store.get(dict_key(did))
+    if dict_id(data) != did:
+        raise ValueError(f"dictionary {did} failed its checksum")
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return data
+
+def current(store):
+    """(id, bytes) of the dictionary new archives should use, or None if none is published."""
+    try:
+        data, _ = store.get(CURRENT)
+    except KeyError:
+        return None
+    did = json.loads(data)['id']
+    return did, load(store, did)
+
+def publish(store, data: bytes, samples: int):
+    """Upload a dictionary and make it current → its id."""
+    did = dict_id(data)
+    store.put(dict_key(did), data)
+    store.put(CURRENT, json.dumps({
+        'id': did, 'size': len(data), 'samples': samples,
+        'trained_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }).encode(), content_type='application/json')
+    return did
+
+def corpus():
+    return [p.read_bytes() for p in sorted(MEMORY_DIR.glob('*.md'))]
+
+def bench(files, size=DICT_SIZE):
+    """
+    Ratio and single-thread speed of each codec over `files`, compressing
+    every file on its own as the archive does. The dictionary is trained on
+    a random half and measured on the other half, so it isn't flattered by
+    having seen the files it compresses. One-off set-up is excluded.
+    """
+    random.seed(0)
+    files = list(files)
+    random.shuffle(files)
+    train_set, test = files[:len(files) // 2], files[len(files) // 2:]
+    zd = train(train_set, size)
+
+    codecs = [
+        ('gzip -9',        lambda b: gzip.compress(b, mtime=0),     gzip.decompress),
+        (f'zstd -{LEVEL}', lambda b: compress(b),                    lambda b: decompress(b)),
+        (f'zstd -{LEVEL} + dict', lambda b: compress(b, zd),         lambda b: decompress(b, zd)),
+    ]
+    raw = sum(len(f) for f in test)
+    print(f"{len(test)} files, {raw / 1e3:.0f} kB (dictionary: {len(zd) / 1e3:.0f} kB "
+          f"trained on {len(train_set)} others)\n")
+    print(f"  {'codec':<20} {'ratio':>7} {'compress':>12} {'decompress':>12}")
+    for name, comp, decomp in codecs:
+        decomp(comp(test[0]))   # one-off context/dictionary set-up isn't per-file cost
+        t0    = time.perf_counter()
+        blobs = [comp(f) for f in test]
+        t1    = time.perf_counter()
+        for b in blobs:
+            decomp(b)
+        t2    = time.perf_counter()
+        out   = sum(len(b) for b in blobs)
+        print(f"  {name:<20} {raw / out:>6.2f}x {raw / 1e6 / (t1 - t0):>8.1f} MB/s "
+              f"{raw / 1e6 / (t2 - t1):>8.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Train and benchmark zstd dictionaries for the cold tier')
+    parser.add_argument('command', choices=['train', 'bench'])
+    parser.add_argument('--size', type=int, default=DICT_SIZE, help=f'Dictionary size in bytes (default {DICT_SIZE})')
+    parser.add_argument('--store', metavar='URL', help='Cold store (default: MEMORY_COLD_STORE or S3)')
+    args = parser.parse_args()
+
+    if not available():
+        sys.exit("[zdict] zstandard is not installed: pip install zstandard")
+    files = corpus()
+    if len(files) < 20:
+        sys.exit(f"[zdict] Only {len(files)} memory files; need at least 20 to train on")
+
+    if args.command == 'bench':
+        bench(files, args.size)
+        return
+
+    import coldstore
+    store = coldstore.open_store(args.store)
+    data  = train(files, args.size)
+    did   = publish(store, data, len(files))
+    print(f"[zdict] Trained {len(data) / 1e3:.0f} kB dictionary on {len(files)} files → "
+          f"{store.url}/{dict_key(did)} (now current)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+definitions.py
+The one build for the definitions glossary: source files in, matching
+definitions-meta.json and embedding store out.
+
+  data/definitions-sources/*.json   lists of definitions (seed.json, article-audit.json, …)
+        │  validate the schema, merge by id, sort by term
+        ▼
+  data/definitions-meta.json        + data/definitions-embeddings.bin / .ids.json
+
+Every source file is read on every build and is authoritative for the ids
+it contains: new ids are added and edited entries replaced. Entries that
+only exist in the meta file are kept, unless --prune is given.
+
+All definitions are embedded ("term: short", as the Lambda does) with the
+model the store declares, in large batches, through the content-hash
+cache (embcache.py), so only new or edited texts reach the model. Vectors
+whose dimension doesn't match the model, or that aren't finite, fail the
+build; switching the store to another model takes --model NAME
+--switch-model and re-embeds everything.
+
+Meta and embeddings are written as one update (embstore.commit): all files
+are staged before any is replaced, and the store header records the
+sha256 of the meta file it was built with, so `check` can tell if they
+ever drift apart. The int8 and 1-bit variants (embquant.py) and the IVF
+index (embann.py) are part of the same update.
+
+`upload` copies what the search-defs Lambda reads (meta, the store and its
+id sidecar, and the legacy JSON while it exists) to its S3 bucket, after
+`check` passes. Without it the Lambda keeps serving the previous upload.
+
+Run:
+  python3 scripts/definitions.py build [--dry-run] [--prune] [extra.json ...]
+  python3 scripts/definitions.py check
+  python3 scripts/definitions.py upload [--bucket NAME] [--dry-run]
+
+Requirements:
+  pip install numpy sentence-transformers   (or OPENAI_API_KEY for text-embedding-3-*)
+  aws CLI with write access to the bucket   (upload)
+"""
+import sys, os, re, json, time, hashlib, argparse, subprocess, urllib.error, urllib.request
+from pathlib import Path
+
+import numpy as np
+
+import embann
+import embcache
+import embquant
+import embstore
+
+SOURCES_DIR = embstore.DATA_DIR / 'definitions-sources'
+META_FILE   = embstore.DATA_DIR / 'definitions-meta.json'
+MODEL_NAME  = embstore.MODEL_NAME
+BATCH_SIZE  = 256
+MODEL_DIMS  = {
+    'sentence-transformers/all-MiniLM-L6-v2': 384,
+    'text-embedding-3-small': 1536,
+    'text-embedding-3-large': 3072,
+}
+OPENAI_URL  = 'https://api.openai.com/v1/embeddings'
+RETRIES     = 4
+BUCKET      = os.environ.get('PDF_BUCKET', 'securebydezign.com')   # as lambda/lib/search-defs.js
+
+ID_RE  = re.compile(r'^[a-z0-9]+(?:-[a-z0-9]+)*$')
+REF_RE = re.compile(r'^(?:CWE-\d+|CVE-\d{4}-\d{4,})$')
+FIELDS = {'id': str, 'term': str, 'category': str, 'source': str, 'url': str,
+          'short': str, 'definition': str, 'tags': list, 'cve_cwe': list}
+
+class BuildError(Exception):
+    """The sources or the embeddings failed validation; nothing was written."""
+
+def embed_text(d: dict):
+    return f"{d['term']}: {d['short']}"
+
+def validate(d, where: str):
+    """Schema problems with one definition → list of messages."""
+    if not isinstance(d, dict):
+        return [f"{where}: not an object"]
+    errors = []
+    for field, kind in FIELDS.items():
+        if field not in d:
+            errors.append(f"{where}: missing '{field}'")
+        elif not isinstance(d[field], kind):
+            errors.append(f"{where}: '{field}' should be a {kind.__name__}")
+        elif kind is str and not d[field].strip():
+            errors.append(f"{where}: '{field}' is empty")
+    if errors:
+        return errors
+    where = f"{where} ({d['id']})"
+    if not ID_RE.match(d['id']):
+        errors.append(f"{where}: id must be lowercase-kebab-case")
+    if extra := sorted(set(d) - set(FIELDS)):
+        errors.append(f"{where}: unknown field(s) {', '.join(extra)}")
+    if not d['url'].startswith(('https://', 'http://')):
+        errors.append(f"{where}: url must be http(s)")
+    if not all(isinstance(t, str) and t.strip() for t in d['tags']):
+        errors.append(f"{where}: tags must be non-empty strings")
+    if bad := [r for r in d['cve_cwe'] if not (isinstance(r, str) and REF_RE.match(r))]:
+        errors.append(f"{where}: cve_cwe entries must look like CWE-79 / CVE-2024-12345, got {bad}")
+    return errors
+
+def load_sources(paths):
+    """{id: definition} from every source file, in order; raises BuildError listing every problem."""
+    merged, origin, errors = {}, {}, []
+    for path in paths:
+        try:
+            entries = json.loads(Path(path).read_text())
+        except (OSError, ValueError) as e:
+            errors.append(f"{path}: {e}")
+            continue
+        if not isinstance(entries, list):
+            errors.append(f"{path}: expected a JSON list of definitions")
+            continue
+        for i, d in enumerate(entries):
+            where = f"{Path(path).name}[{i}]"
+            problems = validate(d, where)
+            errors.extend(problems)
+            if problems:
+                continue
+            if d['id'] in merged and merged[d['id']] != d:
+                errors.append(f"{where}: id {d['id']} is defined differently in {origin[d['id']]}")
+            merged[d['id']], origin[d['id']] = d, where
+    if errors:
+        raise BuildError('\n'.join(errors))
+    return merged
+
+def merge(meta, sources, prune=False):
+    """New meta list (sorted by term) → (meta, {'added', 'updated', 'unchanged', 'removed'} id lists)."""
+    current = {d['id']: d for d in meta}
+    changes = {'added': [], 'updated': [], 'unchanged': [], 'removed': []}
+    for id_, d in sources.items():
+        key = 'added' if id_ not in current else 'unchanged' if current[id_] == d else 'updated'
+        changes[key].append(id_)
+        current[id_] = d
+    if prune:
+        changes['removed'] = [id_ for id_ in current if id_ not in sources]
+        for id_ in changes['removed']:
+            del current[id_]
+    return sorted(current.values(), key=lambda d: d['term'].lower()), changes
+
+# ── Embedding ──────────────────────────────────────────────────────────────
+
+def sentence_transformers_embedder(model_name, batch_size):
+    def embed(texts):
+        from sentence_transformers import SentenceTransformer
+        print(f"Loading model: {model_name}")
+        model = SentenceTransformer(model_name)
+        print(f"Encoding {len(texts)} new or changed definitions...")
+        return model.encode(texts, batch_size=batch_size, show_progress_bar=True,
+                            normalize_embeddings=True)
+    return embed
+
+def openai_key():
+    if os.environ.get('OPENAI_API_KEY'):
+        return os.environ['OPENAI_API_KEY']
+    env_file = embstore.ROOT / '.env.local'
+    if env_file.exists():
+        for line in env_file.read_text().splitlines():
+            if line.startswith('OPENAI_API_KEY='):
+                return line.split('=', 1)[1].strip()
+    raise BuildError("OPENAI_API_KEY is not set (environment or .env.local)")
+
+def openai_embedder(model_name, batch_size):
+    def request(texts, key):
+        data = json.dumps({'model': model_name, 'input': texts}).encode()
+        req  = urllib.request.Request(OPENAI_URL, data=data, headers={
+            'Authorization': f'Bearer {key}', 'Content-Type': 'application/json'})
+        for attempt in range(RETRIES + 1):
+            try:
+                with urllib.request.urlopen(req, timeout=60) as r:
+                    rows = json.loads(r.read())['data']
+                return [row['embedding'] for row in sorted(rows, key=lambda row: row['index'])]
+            except urllib.error.HTTPError as e:
+                if e.code not in (429, 500, 502, 503) or attempt == RETRIES:
+                    raise
+                time.sleep(2 ** attempt)   # rate limited or overloaded: back off, don't pace every call
+
+    def embed(texts):
+        key, out = openai_key(), []
+        for i in range(0, len(texts), batch_size):
+            print(f"  Batch {i // batch_size + 1}: {len(texts[i:i + batch_size])} entries...")
+            out.extend(request(texts[i:i + batch_size], key))
+        return out
+    return embed
+
+def embedder(model_name, batch_size=BATCH_SIZE):
+    if model_name.startswith('text-embedding-'):
+        return openai_embedder(model_name, batch_size)
+    return sentence_transformers_embedder(model_name, batch_size)
+
+def check_vectors(matrix, model_name, dim):
+    """Reject vectors that don't fit the store; return them L2-normalised."""
+    if matrix.ndim != 2 or (len(matrix) and matrix.shape[1] != dim):
+        raise BuildError(f"{model_name} returned {matrix.shape[-1]}-d vectors; the store holds {dim}-d")
+    if not np.all(np.isfinite(matrix)):
+        raise BuildError(f"{model_name} returned non-finite values")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    if np.any(norms == 0):
+        raise BuildError(f"{model_name} returned a zero vector")
+    return (matrix / norms).astype('<f4')
+
+# ── Commands ───────────────────────────────────────────────────────────────
+
+def meta_bytes(meta):
+    return json.dumps(meta, indent=2, ensure_ascii=False).encode()
+
+def build(args):
+    store = embstore.open_store()
+    model = store.model if len(store) else (args.model or MODEL_NAME)
+    if args.model and args.model != model:
+        if not args.switch_model:
+            raise BuildError(f"the store holds {model} vectors; pass --switch-model to re-embed "
+                             f"everything with {args.model}")
+        model = args.model
+    dim = MODEL_DIMS.get(model) or (store.dim if model == store.model and len(store) else None)
+
+    paths = sorted(SOURCES_DIR.glob('*.json')) + [Path(p) for p in args.files]
+    meta  = json.loads(META_FILE.read_text()) if META_FILE.exists() else []
+    errors = [e for i, d in enumerate(meta) for e in validate(d, f"{META_FILE.name}[{i}]")]
+    if errors:
+        raise BuildError('\n'.join(errors))
+    meta, changes = merge(meta, load_sources(paths), prune=args.prune)
+    for key, sign in (('added', '+'), ('updated', '~'), ('removed', '-')):
+        for id_ in changes[key]:
+            print(f"  {sign} {id_}")
+    print(f"{len(paths)} source file(s): {len(changes['added'])} added, {len(changes['updated'])} updated, "
+          f"{len(changes['unchanged'])} unchanged, {len(changes['removed'])} removed → {len(meta)} definitions")
+
+    texts  = [embed_text(d) for d in meta]
+    cache  = embcache.EmbeddingCache(model)
+    try:
+        matrix = cache.encode(texts, embedder(model, args.batch_size))
+    except ValueError:   # np.stack over new and cached vectors of different lengths
+        raise BuildError(f"{model} returned vectors that don't match the {dim or 'cached'}-d ones")
+    matrix = check_vectors(matrix, model, dim or (matrix.shape[1] if len(matrix) else 0))
+
+    if args.dry_run:
+        print(cache.report())   # nothing is saved, so nothing is evicted
+        print(f"[dry-run] Would write {META_FILE} and {embstore.BIN_FILE} ({len(meta)} × {matrix.shape[1]})")
+        return
+    cache.save(keep=texts)   # evicts deleted and reworded definitions
+    print(cache.report())
+    meta_raw = meta_bytes(meta)
+    ids      = [d['id'] for d in meta]
+    header, data, raw_ids = embstore.pack(ids, matrix, model, normalized=True,
+                                          extra={'meta_sha256': hashlib.sha256(meta_raw).hexdigest()})
+    # Store first and meta last: a reader between renames sees definitions without vectors, never the reverse
+    files = [(embstore.ids_path(embstore.BIN_FILE), raw_ids), (embstore.BIN_FILE, data)]
+    if embstore.JSON_FILE.exists():
+        files.append((embstore.JSON_FILE, embstore.json_bytes(ids, matrix)))
+    files += embquant.variant_files(header, matrix) + embann.index_files(header, matrix)
+    files.append((META_FILE, meta_raw))
+    embstore.commit(files)
+    print(f"\n✅ {len(meta)} definitions, {header['count']} × {header['dim']} {model} vectors → "
+          f"{META_FILE.name}, {embstore.BIN_FILE.name}")
+
+def check(args):
+    """Meta and store agree: same ids in the same order, built together, with a known model's dimension."""
+    meta_raw = META_FILE.read_bytes()
+    meta     = json.loads(meta_raw)
+    store    = embstore.load()
+    problems = [e for i, d in enumerate(meta) for e in validate(d, f"{META_FILE.name}[{i}]")]
+    if [d['id'] for d in meta] != store.ids:
+        missing = {d['id'] for d in meta} ^ set(store.ids)
+        problems.append(f"meta and store ids differ ({len(missing)} not in both)" if missing
+                        else "meta and store list ids in a different order")
+    if store.header.get('meta_sha256') not in (None, hashlib.sha256(meta_raw).hexdigest()):
+        problems.append(f"{META_FILE.name} changed since the store was built")
+    if MODEL_DIMS.get(store.model, store.dim) != store.dim:
+        problems.append(f"store is {store.dim}-d but {store.model} is {MODEL_DIMS[store.model]}-d")
+    derived = [(path, lambda p: embstore.read_header(p)[0], 'embquant.py') for path in embquant.VARIANTS.values()]
+    derived.append((embann.INDEX_FILE, embann.read_header, 'embann.py'))
+    for path, read, script in derived:
+        if not path.exists() or read(path)['ids_sha256'] != store.header['ids_sha256']:
+            problems.append(f"{path.name} is missing or stale (run `{script} build`)")
+    if problems:
+        raise BuildError('\n'.join(problems))
+    print(f"✅ {len(meta)} definitions, {store.dim}-d {store.model} vectors, in step")
+
+def upload(args):
+    """Copy the files the Lambda reads to s3://BUCKET/data/, once `check` says they are in step."""
+    check(args)
+    # Same order as build: a Lambda cold start between copies either sees a
+    # store and sidecar that don't match (and falls back to the JSON, copied
+    # first) or definitions without vectors, never vectors without definitions.
+    files = [embstore.JSON_FILE] if embstore.JSON_FILE.exists() else []
+    files += [embstore.ids_path(embstore.BIN_FILE), embstore.BIN_FILE, META_FILE]
+    for path in files:
+        dest = f"s3://{args.bucket}/data/{path.name}"
+        kind = 'application/json' if path.suffix == '.json' else 'application/octet-stream'
+        if args.dry_run:
+            print(f"[dry-run] Would copy {path.name} → {dest}")
+            continue
+        try:
+            subprocess.run(['aws', 's3', 'cp', str(path), dest, '--content-type', kind, '--only-show-errors'],
+                           check=True)
+        except FileNotFoundError:
+            raise BuildError("aws CLI not found; install it or copy the files by hand") from None
+        except subprocess.CalledProcessError as e:
+            raise BuildError(f"copying {path.name} to {dest} failed (exit {e.returncode})") from None
+        print(f"  {path.name} → {dest}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Build, check and upload the definitions glossary')
+    parser.add_argument('command', choices=['build', 'check', 'upload'])
+    parser.add_argument('files', nargs='*', help=f'build: source files besides {SOURCES_DIR.name}/*.json')
+    parser.add_argument('--prune', action='store_true',
+                        help='build: drop meta entries that no source file contains')
+    parser.add_argument('--model', help=f"build: embedding model (default: the store's, else {MODEL_NAME})")
+    parser.add_argument('--switch-model', action='store_true',
+                        help='build: allow --model to replace the store\'s model (re-embeds everything)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'build: texts per model call (default {BATCH_SIZE})')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='build: validate and embed, write nothing; upload: list the copies')
+    parser.add_argument('--bucket', default=BUCKET,
+                        help=f'upload: S3 bucket the Lambda reads (default $PDF_BUCKET or {BUCKET})')
+    args = parser.parse_args()
+    try:
+        {'build': build, 'check': check, 'upload': upload}[args.command](args)
+    except BuildError as e:
+        sys.exit(f"❌ {args.command} failed:\n{e}")
+
+if __name__ == '__main__':
+    main()
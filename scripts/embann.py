@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+embann.py
+Approximate nearest-neighbour index (IVF) over the definition embeddings,
+built offline, for when the glossary grows from hundreds of terms to whole
+catalogues (CWE, ATT&CK, ATLAS: tens of thousands) and a brute-force
+cosine over every vector stops being free.
+
+Build: spherical k-means splits the normalised vectors into `nlist` cells
+(centroids are unit vectors, assignment is by largest dot product); each
+cell's inverted list holds the store rows assigned to it.
+Query: score the centroids, open the `nprobe` best cells and rank their
+rows exactly against the memory-mapped float store, so only those rows are
+read. Recall is traded against latency through nprobe alone.
+
+Layout of data/definitions-embeddings.ivf.bin:
+
+  ┌───────┬────────────┬─────────────────────┬──────────────┬─────────────┬───────────┐
+  │ IVF1  │ header len │ header JSON (padded)│ centroids    │ list offsets│ list rows │
+  └───────┴────────────┴─────────────────────┴──────────────┴─────────────┴───────────┘
+  magic (4 bytes) · header length (u32 LE) · header · then, each starting
+  on a 64-byte boundary at the offset the header gives:
+    centroids  nlist × dim float32 LE
+    offsets    nlist + 1 uint32 LE: cell c is rows[offsets[c]:offsets[c + 1]]
+    rows       count uint32 LE: store row numbers, grouped by cell
+
+  header = {"version": 1, "model": …, "dim": 384, "count": 145, "nlist": 36,
+            "nprobe": 6, "metric": "cosine", "seed": 0, "iterations": 20,
+            "ids_sha256": <the float store's>, "ids_file": "definitions-embeddings.ids.json",
+            "sections": {"centroids": 256, "offsets": …, "rows": …}}
+
+The index only adds 4 bytes per row plus the centroids; vectors stay in
+definitions-embeddings.bin, whose ids_sha256 the header repeats so a stale
+index is refused. The build is seeded, so the same store always gives the
+same file. `definitions.py build` rebuilds it with the store.
+
+Run:
+  python3 scripts/embann.py build [--nlist N]
+  python3 scripts/embann.py search direct-prompt-injection [--nprobe 8]
+  python3 scripts/embann.py bench [--synthetic 20000]   # recall@8 and latency per nprobe, vs exact cosine
+
+Requirements:
+  pip install numpy
+"""
+import sys, json, time, argparse
+from pathlib import Path
+
+import numpy as np
+
+import embquant
+import embstore
+
+INDEX_FILE = embstore.DATA_DIR / 'definitions-embeddings.ivf.bin'
+MAGIC      = b'IVF1'
+VERSION    = 1
+K          = 8
+ITERATIONS = 20
+TRAIN_PER_LIST = 256     # k-means trains on at most this many vectors per cell
+CHUNK      = 4096        # rows per assignment matmul (bounds memory at chunk × nlist floats)
+
+def default_nlist(count):
+    """~4·√n cells (the usual IVF starting point), but at least 4 rows a cell on small stores."""
+    return max(1, min(round(4 * count ** 0.5), count // 4))
+
+def default_nprobe(nlist):
+    return max(1, min(nlist, round(nlist ** 0.5)))
+
+def assign(matrix, centroids):
+    """Nearest centroid of every row, by dot product, in CHUNK-row blocks."""
+    out = np.empty(len(matrix), dtype=np.int64)
+    for i in range(0, len(matrix), CHUNK):
+        out[i:i + CHUNK] = np.argmax(np.asarray(matrix[i:i + CHUNK], dtype='<f4') @ centroids.T, axis=1)
+    return out
+
+def kmeans(matrix, nlist, iterations=ITERATIONS, seed=0):
+    """(nlist, dim) unit centroids by spherical k-means over a seeded sample of the rows."""
+    rng    = np.random.default_rng(seed)
+    sample = rng.choice(len(matrix), size=min(len(matrix), nlist * TRAIN_PER_LIST), replace=False)
+    train  = np.asarray(matrix[np.sort(sample)], dtype='<f4')
+    centroids = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        sims   = train @ centroids.T
+        labels = np.argmax(sims, axis=1)
+        counts = np.bincount(labels, minlength=nlist)
+        order  = np.argsort(labels, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums   = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(train[order], starts[filled])
+        # An empty cell restarts on the training vector its centroid currently serves worst
+        for c, far in zip(np.flatnonzero(counts == 0), np.argsort(sims[np.arange(len(train)), labels])):
+            sums[c] = train[far]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0, 1, norms)
+    return centroids.astype('<f4')
+
+def pack(header, matrix, nlist=None, nprobe=None, seed=0):
+    """Index bytes for a float store (its header and matrix)."""
+    count  = header['count']
+    nlist  = min(nlist or default_nlist(count), max(count, 1))
+    centroids = kmeans(matrix, nlist, seed=seed) if count else np.zeros((0, header['dim']), '<f4')
+    labels = assign(matrix, centroids) if count else np.zeros(0, np.int64)
+    rows   = np.argsort(labels, kind='stable').astype('<u4')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype('<u4')
+
+    sections = [('centroids', centroids), ('offsets', offsets), ('rows', rows)]
+    meta = {'version': VERSION, 'model': header['model'], 'dim': header['dim'], 'count': count,
+            'nlist': nlist, 'nprobe': nprobe or default_nprobe(nlist), 'metric': 'cosine',
+            'seed': seed, 'iterations': ITERATIONS, 'ids_sha256': header['ids_sha256'],
+            'ids_file': embstore.ids_path(embstore.BIN_FILE).name}
+    # The header holds the section offsets, which depend on its own length: repeat until they settle
+    offset = {name: 0 for name, _ in sections}
+    while True:
+        head = json.dumps(dict(meta, sections=offset)).encode()
+        head += b' ' * (-(embstore.PREFIX.size + len(head)) % embstore.ALIGN)
+        pos, placed = embstore.PREFIX.size + len(head), {}
+        for name, array in sections:
+            placed[name] = pos
+            pos += array.nbytes + (-array.nbytes % embstore.ALIGN)
+        if placed == offset:
+            break
+        offset = placed
+    out = bytearray(embstore.PREFIX.pack(MAGIC, len(head)) + head)
+    for name, array in sections:
+        out += array.tobytes() + b'\0' * (-array.nbytes % embstore.ALIGN)
+    return bytes(out)
+
+def index_files(header, matrix):
+    """[(path, bytes)] for embstore.commit() beside the float store."""
+    return [(INDEX_FILE, pack(header, matrix))]
+
+def read_header(path: Path = INDEX_FILE):
+    with open(path, 'rb') as f:
+        magic, length = embstore.PREFIX.unpack(f.read(embstore.PREFIX.size))
+        if magic != MAGIC:
+            raise embstore.StoreError(f"{path} is not an IVF index")
+        header = json.loads(f.read(length))
+    if header.get('version') != VERSION:
+        raise embstore.StoreError(f"unsupported index version {header.get('version')}")
+    return header
+
+class Index:
+    """An IVF index over a float store: centroids and lists in memory, vectors mapped."""
+
+    def __init__(self, path: Path = INDEX_FILE, store=None, raw=None):
+        self.store  = store or embstore.load()
+        raw = raw if raw is not None else Path(path).read_bytes()
+        magic, length = embstore.PREFIX.unpack_from(raw)
+        if magic != MAGIC:
+            raise embstore.StoreError(f"{path} is not an IVF index")
+        self.header = json.loads(raw[embstore.PREFIX.size:embstore.PREFIX.size + length])
+        if self.header.get('version') != VERSION:
+            raise embstore.StoreError(f"unsupported index version {self.header.get('version')}")
+        if self.header['ids_sha256'] != self.store.header['ids_sha256']:
+            raise embstore.StoreError(f"{Path(path).name} is stale: rebuild with `embann.py build`")
+        nlist, at = self.header['nlist'], self.header['sections']
+        self.centroids = np.frombuffer(raw, '<f4', nlist * self.header['dim'], at['centroids']).reshape(nlist, -1)
+        self.offsets   = np.frombuffer(raw, '<u4', nlist + 1, at['offsets'])
+        self.rows      = np.frombuffer(raw, '<u4', self.header['count'], at['rows'])
+
+    def search(self, query, k=K, nprobe=None):
+        """[(id, score)] of the k nearest definitions among the nprobe closest cells."""
+        query  = np.asarray(query, dtype='<f4')
+        nprobe = min(nprobe or self.header['nprobe'], len(self.centroids))
+        cells  = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows   = np.sort(np.concatenate([self.rows[self.offsets[c]:self.offsets[c + 1]] for c in cells]))
+        exact  = np.asarray(self.store.matrix[rows], dtype='<f4') @ query
+        best   = np.argsort(-exact, kind='stable')[:k]
+        return [(self.store.ids[rows[i]], float(exact[i])) for i in best]
+
+def build(nlist=None):
+    store = embstore.load()
+    t0 = time.perf_counter()
+    raw = pack(store.header, np.asarray(store.matrix, dtype='<f4'), nlist)
+    embstore.commit([(INDEX_FILE, raw)])
+    header = read_header()
+    print(f"✅ {header['count']} rows in {header['nlist']} cells (nprobe {header['nprobe']}) → "
+          f"{INDEX_FILE.name} ({len(raw) / 1e3:.1f} kB, {time.perf_counter() - t0:.2f} s)")
+
+def bench(k=K, size=0, nlist=None, queries=200):
+    """recall@k against exact cosine and latency for each nprobe, plus build time and index size."""
+    store, qs = embquant.bench_set(size, queries)
+    exact, exact_ms = embquant.exact_top(store, qs, k)
+    t0    = time.perf_counter()
+    raw   = pack(store.header, store.matrix, nlist)
+    built = time.perf_counter() - t0
+    index = Index(store=store, raw=raw)
+    sizes = np.diff(index.offsets)
+    nl    = index.header['nlist']
+
+    print(f"{len(store)} × {store.dim} {'synthetic' if size else 'glossary'} vectors, {queries} queries, "
+          f"recall@{k} vs exact cosine")
+    print(f"{nl} cells ({sizes.min()}–{sizes.max()} rows, median {int(np.median(sizes))}), "
+          f"built in {built:.2f} s, index {len(raw) / 1e3:.1f} kB\n")
+    print(f"  {'nprobe':>6} {'scanned':>8} {'recall':>7} {'ms/query':>9}")
+    print(f"  {'exact':>6} {'100%':>8} {1:>7.3f} {exact_ms:>9.3f}")
+    probes = sorted({p for p in (1, 2, 4, 8, 16, 32, 64, 128, index.header['nprobe']) if p <= nl})
+    for nprobe in probes:
+        found, ms = embquant.timed(lambda q: index.search(q, k, nprobe), qs)
+        scanned = np.mean([sizes[np.argpartition(-(index.centroids @ q), nprobe - 1)[:nprobe]].sum() for q in qs])
+        mark = '*' if nprobe == index.header['nprobe'] else ' '
+        print(f" {mark}{nprobe:>6} {scanned / len(store):>8.1%} {embquant.recall(found, exact, k):>7.3f} {ms:>9.3f}")
+    print("\n  * default nprobe stored in the index")
+
+def main():
+    parser = argparse.ArgumentParser(description='IVF nearest-neighbour index over the definition embeddings')
+    parser.add_argument('command', choices=['build', 'search', 'bench'])
+    parser.add_argument('id', nargs='?', help='search: definition id whose vector is the query')
+    parser.add_argument('-k', type=int, default=K, help=f'results (default {K})')
+    parser.add_argument('--nlist', type=int, help='build/bench: cells (default ~4·√n)')
+    parser.add_argument('--nprobe', type=int, help="search: cells to scan (default: the index's)")
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                        help='bench: N synthetic vectors modelled on the glossary instead of the glossary')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build(args.nlist)
+    elif args.command == 'search':
+        index = Index()
+        if args.id not in index.store:
+            sys.exit(f"unknown definition id: {args.id}")
+        for id_, score in index.search(index.store.vector(args.id), args.k, args.nprobe):
+            print(f"  {score:.4f}  {id_}")
+    else:
+        bench(args.k, args.synthetic, args.nlist)
+
+if __name__ == '__main__':
+    main()
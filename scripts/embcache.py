@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+embcache.py
+Content-hash cache for definition embeddings, so a rebuild only encodes
+texts that are new or changed.
+
+A vector is keyed on (model name, model revision, sha256 of the exact input
+text). Each model's cache is one embstore.py file under data/embedding-cache/
+whose ids are text hashes and whose header carries the revision; a cache
+built with another revision of the model is ignored, so an upgraded model
+never serves stale vectors. The revision of a Hugging Face model is the
+commit the local hub cache resolves it to, read without loading the model;
+API models (OpenAI) are versioned by name alone.
+
+After a full rebuild, save(keep=texts) evicts every entry whose text no
+longer belongs to a definition (deleted ids and superseded wording), so the
+cache stays the size of the glossary.
+
+Usage (from another script):
+  cache = embcache.EmbeddingCache(MODEL_NAME)
+  vectors = cache.encode(texts, embed)   # embed(list of texts) runs on the misses only
+  cache.save(keep=texts)
+  print(cache.report())
+"""
+import re, hashlib
+from pathlib import Path
+
+import numpy as np
+
+import embstore
+
+CACHE_DIR = embstore.DATA_DIR / 'embedding-cache'
+
+def text_key(text: str):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def hub_revision(model_name: str):
+    """Commit the local Hugging Face cache has for `model_name`, or '' (not a hub model, or not downloaded)."""
+    try:
+        from huggingface_hub.constants import HF_HUB_CACHE
+    except ImportError:
+        return ''
+    ref = Path(HF_HUB_CACHE) / f"models--{model_name.replace('/', '--')}" / 'refs' / 'main'
+    try:
+        return ref.read_text().strip()
+    except OSError:
+        return ''
+
+class EmbeddingCache:
+    """Text-hash → vector for one (model, revision), loaded from and saved to CACHE_DIR."""
+
+    def __init__(self, model_name: str, revision=None, directory: Path = CACHE_DIR):
+        self.model    = model_name
+        self.revision = hub_revision(model_name) if revision is None else revision
+        self.path     = directory / (re.sub(r'[^A-Za-z0-9._-]+', '_', model_name) + '.bin')
+        self.vectors  = {}
+        self.stats    = {'hits': 0, 'misses': 0, 'evicted': 0}
+        if self.path.exists():
+            try:
+                store = embstore.load(self.path)
+            except (embstore.StoreError, OSError, ValueError) as e:
+                print(f"  Embedding cache unreadable, starting afresh: {e}")
+            else:
+                if store.model == model_name and store.header.get('revision', '') == self.revision:
+                    self.vectors = store.to_dict()
+                else:
+                    print(f"  Embedding cache is for {store.model}@{store.header.get('revision') or '?'}; "
+                          f"starting afresh for {model_name}@{self.revision or '?'}")
+        self.loaded = bool(self.vectors)
+
+    def encode(self, texts, embed):
+        """
+        Vectors for `texts`, in order, as an (n, dim) float32 matrix.
+        `embed` is called once, with the distinct texts that missed.
+        """
+        texts  = list(texts)
+        keys   = [text_key(t) for t in texts]
+        misses = {k: t for k, t in zip(keys, texts) if k not in self.vectors}
+        missed = sum(k in misses for k in keys)
+        self.stats['hits']   += len(keys) - missed
+        self.stats['misses'] += missed
+        if misses:
+            for key, vec in zip(misses, embed(list(misses.values()))):
+                self.vectors[key] = np.asarray(vec, dtype='<f4')
+        if not keys:
+            return np.zeros((0, 0), dtype='<f4')
+        return np.stack([self.vectors[k] for k in keys])
+
+    def save(self, keep=None):
+        """Persist the cache; with `keep` (texts), first evict every entry not among them."""
+        if keep is not None:
+            wanted = {text_key(t) for t in keep}
+            stale  = [k for k in self.vectors if k not in wanted]
+            for k in stale:
+                del self.vectors[k]
+            self.stats['evicted'] += len(stale)
+        if not self.revision and not self.loaded:
+            # First run downloads the model, so its revision is only known now
+            self.revision = hub_revision(self.model)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        keys = list(self.vectors)
+        embstore.save(keys, [self.vectors[k] for k in keys], self.model, path=self.path,
+                      extra={'revision': self.revision})
+
+    def report(self):
+        looked = self.stats['hits'] + self.stats['misses']
+        rate   = self.stats['hits'] / looked if looked else 1.0
+        return (f"Embedding cache: {self.stats['hits']}/{looked} hits ({rate:.1%}), "
+                f"{self.stats['misses']} encoded, {self.stats['evicted']} evicted "
+                f"({len(self.vectors)} cached → {self.path})")
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+embquant.py
+Quantized copies of the definition embeddings, and the reference search
+that uses them: a cheap prefilter over the small codes, then an exact
+float32 rescore of the few candidates it keeps.
+
+  data/definitions-embeddings.i8.bin   int8, 1 byte per dimension     (4× smaller)
+  data/definitions-embeddings.b1.bin   1 bit per dimension            (32× smaller)
+
+Both are embstore.py files (same magic, header and 64-byte aligned matrix)
+that share the float store's ids sidecar:
+
+  int8  header adds "scales": [dim floats]
+        code = round(x / scale[d]), scale[d] = max |x[:, d]| / 127,
+        so every dimension uses the full -127..127 range
+  bit   header adds "centers": [dim floats]
+        bit d of a row = x[d] > center[d] (column mean), packed
+        little-endian into dim / 8 bytes
+
+Prefilter scores: int8 is the dot product of the query with the
+dequantized codes, (q · scale) @ codes; bit binarizes the query against the
+same centers and ranks by Hamming distance. The top `candidates` rows are
+then rescored with the float store, which is memory-mapped, so only those
+rows are read (the Lambda can fetch the same rows by byte range: offset +
+row × dim × 4).
+
+`definitions.py build` writes both variants with the float store; `build`
+here rebuilds them from the current store.
+
+Run:
+  python3 scripts/embquant.py build
+  python3 scripts/embquant.py search direct-prompt-injection [--variant bit] [--candidates 32]
+  python3 scripts/embquant.py bench [--synthetic 20000]   # recall@8 vs exact cosine, latency, size
+
+Requirements:
+  pip install numpy
+"""
+import sys, time, argparse
+
+import numpy as np
+
+import embstore
+
+VARIANTS   = {'int8': embstore.DATA_DIR / 'definitions-embeddings.i8.bin',
+              'bit':  embstore.DATA_DIR / 'definitions-embeddings.b1.bin'}
+K          = 8
+CANDIDATES = 32
+POPCOUNT   = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+def popcount(words):
+    """Set bits per row; np.bitwise_count needs numpy 2, the byte table is the fallback."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int32)
+    return POPCOUNT[words.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+def quantize_int8(matrix):
+    """(codes, scales): symmetric per-dimension int8."""
+    matrix = np.asarray(matrix, dtype='<f4')
+    scales = np.abs(matrix).max(axis=0) / 127 if len(matrix) else np.ones(matrix.shape[1], '<f4')
+    scales[scales == 0] = 1
+    codes = np.clip(np.rint(matrix / scales), -127, 127).astype('i1')
+    return codes, scales.astype('<f4')
+
+def quantize_bits(matrix, centers=None):
+    """(packed bits, centers): one bit per dimension, set when above that dimension's mean."""
+    matrix = np.asarray(matrix, dtype='<f4')
+    if centers is None:
+        centers = matrix.mean(axis=0) if len(matrix) else np.zeros(matrix.shape[1], '<f4')
+    return np.packbits(matrix > centers, axis=-1, bitorder='little'), centers.astype('<f4')
+
+def quantize(header, matrix, dtype):
+    """(header, codes) of the `dtype` variant of a float store's header and matrix."""
+    if dtype == 'int8':
+        codes, params = quantize_int8(matrix)
+        extra = {'scales': params.tolist()}
+    else:
+        codes, params = quantize_bits(matrix)
+        extra = {'centers': params.tolist()}
+    return {'version': embstore.VERSION, 'model': header['model'], 'dim': header['dim'],
+            'count': header['count'], 'dtype': dtype, 'normalized': header['normalized'],
+            'ids_sha256': header['ids_sha256'],
+            'ids_file': embstore.ids_path(embstore.BIN_FILE).name, **extra}, codes
+
+def variant_files(header, matrix):
+    """[(path, bytes)] of every variant, for embstore.commit() beside the float store."""
+    return [(path, embstore.frame(*quantize(header, matrix, dtype))) for dtype, path in VARIANTS.items()]
+
+class Index:
+    """Prefilter over one quantized variant + exact rescore over the float store."""
+
+    def __init__(self, variant='int8', store=None, codes=None):
+        self.store   = store or embstore.load()
+        self.variant = variant
+        self.codes   = codes or embstore.load(VARIANTS[variant])
+        if self.codes.header['ids_sha256'] != self.store.header['ids_sha256']:
+            raise embstore.StoreError(f"{VARIANTS[variant].name} is stale: rebuild with `embquant.py build`")
+        self.matrix = np.asarray(self.codes.matrix)
+        if variant == 'int8':
+            self.scales = np.asarray(self.codes.header['scales'], dtype='<f4')
+            self.matrix = self.matrix.astype('<f4')   # small to ship; widened once so scoring is one BLAS matvec
+        else:
+            self.centers = np.asarray(self.codes.header['centers'], dtype='<f4')
+            if self.matrix.shape[1] % 8 == 0:          # XOR and count 64 dimensions at a time
+                self.matrix = self.matrix.view('<u8')
+
+    def prefilter(self, query, n):
+        """Rows of the n best candidates by the quantized score, best first."""
+        if self.variant == 'int8':
+            score = self.matrix @ (query * self.scales)
+        else:
+            bits, _ = quantize_bits(query[None, :], self.centers)
+            score = -popcount(self.matrix ^ bits.view(self.matrix.dtype))
+        n = min(n, len(score))
+        top = np.argpartition(-score, n - 1)[:n] if n < len(score) else np.arange(len(score))
+        return top[np.argsort(-score[top], kind='stable')]
+
+    def search(self, query, k=K, candidates=CANDIDATES, rescore=True):
+        """[(id, score)] of the k nearest definitions to a normalised query vector."""
+        query = np.asarray(query, dtype='<f4')
+        rows  = self.prefilter(query, max(k, candidates) if rescore else k)
+        if not rescore:
+            return [(self.store.ids[r], None) for r in rows]
+        rows  = np.sort(rows)   # sequential reads of the mapped float rows
+        exact = np.asarray(self.store.matrix[rows], dtype='<f4') @ query
+        best  = np.argsort(-exact, kind='stable')[:k]
+        return [(self.store.ids[rows[i]], float(exact[i])) for i in best]
+
+def build(store=None):
+    store = store or embstore.load()
+    matrix = np.asarray(store.matrix, dtype='<f4')
+    embstore.commit(variant_files(store.header, matrix))
+    for dtype, path in VARIANTS.items():
+        print(f"✅ {dtype:<4} → {path.name} ({path.stat().st_size / 1e3:.1f} kB)")
+
+# ── Benchmark ──────────────────────────────────────────────────────────────
+
+def normalise(m):
+    return (m / np.linalg.norm(m, axis=1, keepdims=True)).astype('<f4')
+
+def synthetic(matrix, n, rng):
+    """n vectors shaped like the glossary: blends of three real definitions plus noise."""
+    picks = rng.integers(0, len(matrix), size=(n, 3))
+    mixed = np.einsum('nk,nkd->nd', rng.dirichlet([1, 1, 1], size=n), matrix[picks])
+    return normalise(mixed + rng.normal(0, matrix.std() * 0.5, size=mixed.shape))
+
+def bench_set(size=0, queries=200, seed=7):
+    """(float Store, queries) to benchmark on: the glossary, or `size` synthetic vectors, with ids v0, v1, …"""
+    rng    = np.random.default_rng(seed)
+    store  = embstore.load()
+    corpus = np.asarray(store.matrix, dtype='<f4')
+    if size:
+        corpus = synthetic(corpus, size, rng)
+    # Queries sit between two corpus vectors, so neighbours aren't trivially the query itself
+    pairs = rng.integers(0, len(corpus), size=(queries, 2))
+    qs    = normalise(corpus[pairs].sum(axis=1) + rng.normal(0, corpus.std() * 0.3, size=(queries, corpus.shape[1])))
+    ids   = [f'v{i}' for i in range(len(corpus))]
+    header, _, _ = embstore.pack(ids, corpus, store.model, normalized=True)
+    return embstore.Store(ids, corpus, header), qs
+
+def timed(fn, qs):
+    """(fn(q) for every query, mean ms per query)."""
+    t0  = time.perf_counter()
+    out = [fn(q) for q in qs]
+    return out, (time.perf_counter() - t0) / len(qs) * 1000
+
+def exact_top(store, qs, k):
+    """(exact top-k id lists by cosine, ms per query) — the ground truth for recall@k."""
+    corpus = np.asarray(store.matrix)
+    return timed(lambda q: [store.ids[i] for i in np.argsort(-(corpus @ q), kind='stable')[:k]], qs)
+
+def recall(found, exact, k):
+    return float(np.mean([len({i for i, _ in f} & set(e)) / k for f, e in zip(found, exact)]))
+
+def bench(k=K, size=0, queries=200, seed=7):
+    """recall@k against exact cosine, per-query latency and payload of each variant and candidate count."""
+    fstore, qs = bench_set(size, queries, seed)
+    corpus, header, ids = fstore.matrix, fstore.header, fstore.ids
+    exact, exact_ms = exact_top(fstore, qs, k)
+
+    print(f"{len(corpus)} × {corpus.shape[1]} {'synthetic' if size else 'glossary'} vectors, "
+          f"{queries} queries, recall@{k} vs exact cosine\n")
+    print(f"  {'variant':<8} {'bytes/row':>9} {'payload':>10} {'candidates':>12} {'recall':>7} {'ms/query':>9}")
+    print(f"  {'float32':<8} {corpus.shape[1] * 4:>9} {corpus.nbytes / 1e3:>7.0f} kB {'all':>12} "
+          f"{1:>7.3f} {exact_ms:>9.3f}")
+    for dtype in VARIANTS:
+        qheader, codes = quantize(header, corpus, dtype)
+        payload = len(embstore.frame(qheader, codes))
+        index   = Index(dtype, fstore, embstore.Store(ids, codes, qheader))
+        per_row = embstore.columns(qheader)
+        runs = [(k, False)] + [(c, True) for c in (k, 2 * k, 4 * k, 8 * k, 16 * k) if c <= len(corpus)]
+        for cands, rescore in runs:
+            found, ms = timed(lambda q: index.search(q, k, cands, rescore), qs)
+            label = f"{cands}{' +rescore' if rescore else ''}"
+            print(f"  {dtype:<8} {per_row:>9} {payload / 1e3:>7.0f} kB {label:>12} {recall(found, exact, k):>7.3f} {ms:>9.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantized definition embeddings: build, search, benchmark')
+    parser.add_argument('command', choices=['build', 'search', 'bench'])
+    parser.add_argument('id', nargs='?', help='search: definition id whose vector is the query')
+    parser.add_argument('--variant', choices=list(VARIANTS), default='int8')
+    parser.add_argument('-k', type=int, default=K, help=f'results (default {K})')
+    parser.add_argument('--candidates', type=int, default=CANDIDATES,
+                        help=f'search: prefilter candidates to rescore (default {CANDIDATES})')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                        help='bench: N synthetic vectors modelled on the glossary instead of the glossary')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build()
+    elif args.command == 'search':
+        index = Index(args.variant)
+        if args.id not in index.store:
+            sys.exit(f"unknown definition id: {args.id}")
+        for id_, score in index.search(index.store.vector(args.id), args.k, args.candidates):
+            print(f"  {score:.4f}  {id_}")
+    else:
+        bench(args.k, args.synthetic)
+
+if __name__ == '__main__':
+    main()
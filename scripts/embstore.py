@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+embstore.py
+Binary store for the definition embeddings, replacing the JSON dict in
+data/definitions-embeddings.json (every float as text, fully re-parsed by
+each writer).
+
+Layout of data/definitions-embeddings.bin:
+
+  ┌───────┬────────────┬──────────────────────────┬──────────────────────────┐
+  │ EMB1  │ header len │ header JSON (padded)     │ matrix, count × dim      │
+  └───────┴────────────┴──────────────────────────┴──────────────────────────┘
+  magic (4 bytes) · header length (u32 LE) · header · little-endian float32
+  or float16 rows, row-major, starting on a 64-byte boundary
+
+  header = {"version": 1, "model": "sentence-transformers/all-MiniLM-L6-v2",
+            "dim": 384, "count": 145, "dtype": "float32" | "float16",
+            "normalized": true, "ids_sha256": <first 16 hex of the sidecar's hash>}
+
+Row i is the vector of ids[i], where ids is the JSON list in the sidecar
+data/definitions-embeddings.ids.json. The header records the sidecar's
+hash, so a stale or mismatched sidecar is caught on load. commit() stages
+every file of an update in full before renaming any of them, so readers
+never see a half-written store.
+
+The quantized variants written by embquant.py use the same layout with
+dtype "int8" or "bit" (dim / 8 packed bytes per row) and name the float
+store's sidecar in "ids_file" instead of carrying their own.
+
+load() maps the matrix with np.memmap: opening the store reads only the
+header and the id list, whatever the glossary size. export_json() writes
+the old {"id": [floats]} file for consumers that still read it; save()
+keeps an existing JSON export up to date.
+
+Run:
+  python3 scripts/embstore.py convert [--float16]   # JSON → binary
+  python3 scripts/embstore.py export                # binary → JSON
+  python3 scripts/embstore.py info
+  python3 scripts/embstore.py bench                 # JSON vs binary load time and size
+
+Requirements:
+  pip install numpy
+"""
+import sys, json, struct, hashlib, argparse, os, tempfile, time
+from pathlib import Path
+
+import numpy as np
+
+ROOT       = Path(__file__).resolve().parents[1]
+DATA_DIR   = ROOT / 'data'
+BIN_FILE   = DATA_DIR / 'definitions-embeddings.bin'
+JSON_FILE  = DATA_DIR / 'definitions-embeddings.json'
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'  # 384 dimensions
+
+MAGIC   = b'EMB1'
+VERSION = 1
+PREFIX  = struct.Struct('<4sI')   # magic, header length
+ALIGN   = 64                      # matrix offset alignment (cache line / SIMD friendly)
+DTYPES  = {'float32': '<f4', 'float16': '<f2', 'int8': 'i1', 'bit': 'u1'}
+
+class StoreError(Exception):
+    """Not an embedding store, or one whose parts don't match."""
+
+def ids_path(path: Path):
+    return path.with_suffix('.ids.json')
+
+def ids_digest(raw: bytes):
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+def columns(header):
+    """Stored values per row: dim, or dim / 8 bytes for packed bits."""
+    return -(-header['dim'] // 8) if header['dtype'] == 'bit' else header['dim']
+
+class Store:
+    """Ids, an (n, dim) matrix (memory-mapped when loaded from disk) and the header."""
+
+    def __init__(self, ids, matrix, header):
+        self.ids, self.matrix, self.header = list(ids), matrix, header
+        self.row = {id_: i for i, id_ in enumerate(self.ids)}
+
+    model      = property(lambda self: self.header['model'])
+    dim        = property(lambda self: self.header['dim'])
+    normalized = property(lambda self: self.header['normalized'])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id_):
+        return id_ in self.row
+
+    def vector(self, id_):
+        """float32 copy of one id's vector."""
+        return np.asarray(self.matrix[self.row[id_]], dtype='<f4')
+
+    def to_dict(self):
+        """{id: vector} — the shape writers merge new entries into."""
+        return {id_: self.vector(id_) for id_ in self.ids}
+
+def commit(files):
+    """
+    Write several (path, bytes) files as one update: every file is staged
+    in full beside its target before the first rename, so a failure part
+    way leaves the old set untouched, and the renames run back to back.
+    """
+    staged, umask = [], os.umask(0)
+    os.umask(umask)
+    try:
+        for path, data in files:
+            fd, tmp = tempfile.mkstemp(dir=Path(path).parent, prefix=f'.{Path(path).name}.')
+            staged.append((tmp, path))
+            os.chmod(tmp, 0o666 & ~umask)   # mkstemp's 0600 would make the published files private
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        for tmp, _ in staged:
+            os.unlink(tmp)
+        raise
+    for tmp, path in staged:
+        os.replace(tmp, path)
+
+def is_normalized(matrix, tol=1e-3):
+    norms = np.linalg.norm(np.asarray(matrix, dtype='<f4'), axis=1)
+    return bool(len(norms) == 0 or np.all(np.abs(norms - 1) < tol))
+
+def pack(ids, matrix, model=MODEL_NAME, dtype='float32', normalized=None, extra=None):
+    """
+    Encode ids and an (n, dim) matrix (or a list of vectors) → (header,
+    store bytes, sidecar bytes). `normalized` defaults to checking the rows'
+    norms; `extra` adds header fields.
+    """
+    ids    = list(ids)
+    if not isinstance(matrix, np.ndarray):
+        dims = {len(v) for v in matrix}
+        if len(dims) > 1:
+            raise StoreError(f"vectors have mixed dimensions {sorted(dims)}")
+        matrix = np.array(matrix, dtype='<f4').reshape(len(ids), dims.pop() if dims else 0)
+    if normalized is None:
+        normalized = is_normalized(matrix)
+    matrix = np.asarray(matrix, dtype=DTYPES[dtype])
+    if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+        raise StoreError(f"expected a ({len(ids)}, dim) matrix, got shape {matrix.shape}")
+    if len(set(ids)) != len(ids):
+        raise StoreError("duplicate ids")
+    raw_ids = json.dumps(ids, ensure_ascii=False).encode()
+    header  = {'version': VERSION, 'model': model, 'dim': int(matrix.shape[1]), 'count': len(ids),
+               'dtype': dtype, 'normalized': normalized,
+               'ids_sha256': ids_digest(raw_ids), **(extra or {})}
+    return header, frame(header, matrix), raw_ids
+
+def frame(header, matrix):
+    """Store bytes for a header and its already-encoded (count, columns) matrix."""
+    head = json.dumps(header).encode()
+    head += b' ' * (-(PREFIX.size + len(head)) % ALIGN)
+    return PREFIX.pack(MAGIC, len(head)) + head + np.ascontiguousarray(matrix).tobytes()
+
+def save(ids, matrix, model=MODEL_NAME, path=BIN_FILE, dtype='float32', normalized=None, extra=None):
+    """Write a store (see pack()), sidecar first. Refreshes the JSON export if one exists."""
+    header, data, raw_ids = pack(ids, matrix, model, dtype, normalized, extra)
+    files = [(ids_path(path), raw_ids), (path, data)]
+    if path == BIN_FILE and JSON_FILE.exists():
+        files.append((JSON_FILE, json_bytes(ids, matrix)))
+    commit(files)
+    return header
+
+def read_header(path: Path = BIN_FILE):
+    """(header dict, matrix byte offset)."""
+    with open(path, 'rb') as f:
+        magic, length = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC:
+            raise StoreError(f"{path} is not an embedding store")
+        header = json.loads(f.read(length))
+    if header.get('version') != VERSION:
+        raise StoreError(f"unsupported store version {header.get('version')}")
+    return header, PREFIX.size + length
+
+def load(path: Path = BIN_FILE, mmap=True):
+    """Open a store. The matrix is an np.memmap (no read until used) unless mmap=False."""
+    path = Path(path)
+    header, offset = read_header(path)
+    sidecar = path.parent / header['ids_file'] if 'ids_file' in header else ids_path(path)
+    raw_ids = sidecar.read_bytes()
+    if ids_digest(raw_ids) != header['ids_sha256']:
+        raise StoreError(f"{sidecar.name} doesn't belong to {path.name}")
+    shape = (header['count'], columns(header))
+    if mmap and header['count']:
+        matrix = np.memmap(path, dtype=DTYPES[header['dtype']], mode='r', offset=offset, shape=shape)
+    else:
+        matrix = np.fromfile(path, dtype=DTYPES[header['dtype']], offset=offset).reshape(shape)
+    return Store(json.loads(raw_ids), matrix, header)
+
+def load_json(path: Path = JSON_FILE, model=MODEL_NAME):
+    """A Store built from the legacy {"id": [floats]} file (all vectors must share one dimension)."""
+    emb = json.loads(Path(path).read_text())
+    ids = list(emb)
+    dims = {len(v) for v in emb.values()}
+    if len(dims) > 1:
+        raise StoreError(f"{path} mixes vector dimensions {sorted(dims)}")
+    matrix = np.array([emb[i] for i in ids], dtype='<f4').reshape(len(ids), dims.pop() if dims else 0)
+    return Store(ids, matrix, {'version': VERSION, 'model': model, 'dim': matrix.shape[1],
+                               'count': len(ids), 'dtype': 'float32',
+                               'normalized': is_normalized(matrix)})
+
+def open_store(model=MODEL_NAME):
+    """The current store: the binary one, else the legacy JSON, else an empty store for `model`."""
+    if BIN_FILE.exists():
+        return load(BIN_FILE)
+    if JSON_FILE.exists():
+        return load_json(JSON_FILE, model)
+    return Store([], np.zeros((0, 0), dtype='<f4'),
+                 {'version': VERSION, 'model': model, 'dim': 0, 'count': 0,
+                  'dtype': 'float32', 'normalized': True})
+
+def json_bytes(ids, matrix):
+    """The legacy {"id": [floats]} file (float32 values, as the JSON writers produced)."""
+    rows = np.asarray(matrix, dtype='<f4')
+    return json.dumps({id_: row.tolist() for id_, row in zip(ids, rows)}, ensure_ascii=False).encode()
+
+def export_json(store: Store, path: Path = JSON_FILE):
+    commit([(Path(path), json_bytes(store.ids, store.matrix))])
+
+def bench(runs=20):
+    """Load time and size of the JSON file against the binary store (parse vs map + touch every row)."""
+    def timed(fn):
+        best = float('inf')
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return best * 1000
+
+    json_ms = timed(lambda: np.array(list(json.loads(JSON_FILE.read_text()).values()), dtype='<f4'))
+    bin_ms  = timed(lambda: load(BIN_FILE))
+    full_ms = timed(lambda: np.asarray(load(BIN_FILE).matrix).sum())
+    json_kb = JSON_FILE.stat().st_size / 1e3
+    bin_kb  = (BIN_FILE.stat().st_size + ids_path(BIN_FILE).stat().st_size) / 1e3
+    header, _ = read_header(BIN_FILE)
+    print(f"{header['count']} × {header['dim']} {header['dtype']}, best of {runs}\n")
+    print(f"  {'':<26} {'size':>10} {'load':>10}")
+    print(f"  {'JSON (parse)':<26} {json_kb:>7.0f} kB {json_ms:>7.2f} ms")
+    print(f"  {'binary (open, mmap)':<26} {bin_kb:>7.0f} kB {bin_ms:>7.2f} ms")
+    print(f"  {'binary (open + read all)':<26} {'':>10} {full_ms:>7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert, export and inspect the definition embedding store')
+    parser.add_argument('command', choices=['convert', 'export', 'info', 'bench'])
+    parser.add_argument('--float16', action='store_true', help='convert: store half-precision rows')
+    parser.add_argument('--model', default=MODEL_NAME,
+                        help=f'convert: model the JSON vectors came from (default {MODEL_NAME})')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        store  = load_json(JSON_FILE, args.model)
+        header = save(store.ids, store.matrix, args.model, dtype='float16' if args.float16 else 'float32')
+        print(f"✅ {header['count']} × {header['dim']} {header['dtype']} → {BIN_FILE} "
+              f"({BIN_FILE.stat().st_size / 1e3:.0f} kB, JSON was {JSON_FILE.stat().st_size / 1e3:.0f} kB)")
+    elif args.command == 'export':
+        export_json(load(BIN_FILE))
+        print(f"✅ Exported {JSON_FILE}")
+    elif args.command == 'info':
+        header, offset = read_header(BIN_FILE)
+        print(json.dumps(dict(header, matrix_offset=offset), indent=2))
+    else:
+        if not (BIN_FILE.exists() and JSON_FILE.exists()):
+            sys.exit("bench needs both stores: run `embstore.py convert` first")
+        bench()
+
+if __name__ == '__main__':
+    main()